@@ -0,0 +1,12 @@
+import os
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def asset_dir(name):
+    # Asset folders (Templates, Samples, Avatars, FinalPass) sit next to the
+    # scripts when deployed, or one level up at the repo root
+    local_dir = os.path.join(script_dir, name)
+    if os.path.isdir(local_dir):
+        return local_dir
+    return os.path.join(os.path.dirname(script_dir), name)
@@ -0,0 +1,94 @@
+import glob
+import os
+import threading
+
+from PIL import Image
+
+from assets import asset_dir
+from base_layer import AVATAR_SIZE
+from masks import get_mask
+
+# Bump when the avatar layer recipe changes so stale files in the disk cache are ignored
+AVATAR_CACHE_VERSION = 2
+
+_catalogue = {}  # avatar_type -> (Samples folder mtime, sample paths)
+_avatars = {}  # (avatar_path, size) -> circular RGBA avatar layer
+_lock = threading.Lock()
+
+
+def sample_avatar_paths(avatar_type):
+    """All Samples/{avatar_type}_Sample*.png files, rescanned when the folder changes."""
+    samples_dir = asset_dir("Samples")
+    try:
+        mtime = os.stat(samples_dir).st_mtime_ns
+    except OSError:
+        return []
+    with _lock:
+        entry = _catalogue.get(avatar_type)
+    if entry is None or entry[0] != mtime:
+        paths = sorted(glob.glob(os.path.join(glob.escape(samples_dir), f"{glob.escape(avatar_type)}_Sample*.png")))
+        entry = (mtime, paths)
+        with _lock:
+            _catalogue[avatar_type] = entry
+    return entry[1]
+
+
+def make_circular_avatar(avatar, size=AVATAR_SIZE):
+    # Resized avatar with a circular alpha channel, ready to paste with itself as mask
+    avatar_resized = avatar.convert('RGB').resize(size)
+    avatar_resized.putalpha(get_mask(size, "circle"))
+    return avatar_resized
+
+
+def _disk_cache_path(avatar_path, size):
+    name = os.path.splitext(os.path.basename(avatar_path))[0]
+    cache_dir = os.path.join(os.path.dirname(avatar_path), ".cache")
+    return os.path.join(cache_dir, f"{name}_{size[0]}x{size[1]}_v{AVATAR_CACHE_VERSION}.png")
+
+
+def _load_from_disk(avatar_path, size):
+    cache_path = _disk_cache_path(avatar_path, size)
+    try:
+        if os.stat(cache_path).st_mtime_ns < os.stat(avatar_path).st_mtime_ns:
+            return None
+        with Image.open(cache_path) as image:
+            image.load()
+            return image if image.mode == 'RGBA' and image.size == size else None
+    except OSError:
+        return None
+
+
+def _save_to_disk(avatar_path, size, avatar_layer):
+    cache_path = _disk_cache_path(avatar_path, size)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        avatar_layer.save(tmp_path, format="PNG", compress_level=1)
+        # Workers may race on the same file, the rename keeps readers from seeing a partial PNG
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write avatar cache {cache_path}: {e}")
+
+
+def load_circular_avatar(avatar_path, size=AVATAR_SIZE):
+    """Return the pre-resized, pre-masked sample avatar layer - shared, do not draw on it.
+
+    Looked up in memory, then in Samples/.cache, and only built from the source PNG on a miss.
+    """
+    key = (avatar_path, size)
+    with _lock:
+        avatar_layer = _avatars.get(key)
+    if avatar_layer is None:
+        avatar_layer = _load_from_disk(avatar_path, size)
+        if avatar_layer is None:
+            with Image.open(avatar_path) as avatar:
+                avatar_layer = make_circular_avatar(avatar, size)
+            _save_to_disk(avatar_path, size, avatar_layer)
+        with _lock:
+            avatar_layer = _avatars.setdefault(key, avatar_layer)
+    return avatar_layer
+
+
+def preload_sample_avatars(size=AVATAR_SIZE):
+    for avatar_path in sorted(glob.glob(os.path.join(glob.escape(asset_dir("Samples")), "*.png"))):
+        load_circular_avatar(avatar_path, size)
@@ -0,0 +1,107 @@
+import glob
+import os
+import threading
+
+from assets import asset_dir
+from raw_store import map_raw, raw_path_for, write_raw
+from template_cache import load_template
+
+# Fixed pass layout on the 1080x1920 pillar templates
+AVATAR_SIZE = (420, 420)
+AVATAR_POSITION = (330, 666)
+NAME_Y = 1132
+AVATAR_NAME_Y = 1299
+TAGLINE_Y = 1369
+# Text lines shrink to fit inside the white pills (x 109-970) with some padding
+TEXT_MAX_WIDTH = 820
+QR_SIZE = (400, 400)
+QR_Y = 1517
+
+# Extra rows kept around each text line for glyphs reaching past the font metrics
+TEXT_PADDING = 8
+# Bump when build_base_layer changes so raw store files from the old recipe are ignored
+BASE_LAYER_VERSION = 1
+
+_bases = {}  # template_path -> (decoded template, base layer built from it)
+_tiles = {}  # (id(base), box) -> (base, base cropped to box)
+_lock = threading.Lock()
+
+
+def build_base_layer(template):
+    # The QR box is cleared to white up front, passes then only draw the dark QR modules
+    base = template.copy()
+    qr_x, qr_y = qr_position(base.width)
+    base.paste('white', (qr_x, qr_y, qr_x + QR_SIZE[0], qr_y + QR_SIZE[1]))
+    return base
+
+
+def get_base_layer(template_path):
+    """The static base layer of a pillar, shared - do not draw on it.
+
+    Mapped from the raw store without decoding when raw_store.py has been run for the current
+    template, otherwise built from the decoded PNG and rebuilt whenever the template is reloaded.
+    """
+    base = map_raw(raw_path_for(template_path), os.stat(template_path).st_mtime_ns, BASE_LAYER_VERSION)
+    if base is not None:
+        return base
+
+    template = load_template(template_path)
+    with _lock:
+        entry = _bases.get(template_path)
+    if entry is None or entry[0] is not template:
+        entry = (template, build_base_layer(template))
+        with _lock:
+            _bases[template_path] = entry
+    return entry[1]
+
+
+def build_raw_base_layers():
+    # Build step for the raw store, one file per Templates/*_TEMPLATE.png
+    raw_paths = []
+    for template_path in sorted(glob.glob(os.path.join(glob.escape(asset_dir("Templates")), "*_TEMPLATE.png"))):
+        source_mtime = os.stat(template_path).st_mtime_ns
+        raw_path = raw_path_for(template_path)
+        write_raw(build_base_layer(load_template(template_path)), raw_path, source_mtime, BASE_LAYER_VERSION)
+        raw_paths.append(raw_path)
+    return raw_paths
+
+
+def qr_position(pass_width):
+    return ((pass_width - QR_SIZE[0]) // 2, QR_Y)
+
+
+def text_band(font, y, pass_width):
+    ascent, descent = font.getmetrics()
+    return (0, max(y - TEXT_PADDING, 0), pass_width, y + ascent + descent + TEXT_PADDING)
+
+
+def dirty_regions(pass_width, name_font, avatar_font, catchphrase_font):
+    """Boxes that change from pass to pass: avatar circle, the three text lines and the QR code."""
+    avatar_x, avatar_y = AVATAR_POSITION
+    qr_x, qr_y = qr_position(pass_width)
+    return [
+        (avatar_x, avatar_y, avatar_x + AVATAR_SIZE[0], avatar_y + AVATAR_SIZE[1]),
+        text_band(name_font, NAME_Y, pass_width),
+        text_band(avatar_font, AVATAR_NAME_Y, pass_width),
+        text_band(catchphrase_font, TAGLINE_Y, pass_width),
+        (qr_x, qr_y, qr_x + QR_SIZE[0], qr_y + QR_SIZE[1]),
+    ]
+
+
+def base_tile(base, box):
+    # The base layer cropped to a dirty region, cropped once and then pasted back on every reset
+    key = (id(base), box)
+    with _lock:
+        entry = _tiles.get(key)
+    if entry is None or entry[0] is not base:
+        entry = (base, base.crop(box))
+        with _lock:
+            _tiles[key] = entry
+    return entry[1]
+
+
+def reset_dirty_regions(canvas, base, regions):
+    # Turn a canvas from a previous pass of the same pillar back into the base layer
+    for box in regions:
+        canvas.paste(base_tile(base, box), box[:2])
+    return canvas
@@ -0,0 +1,106 @@
+#Bulk pass issuance from a CSV or JSONL attendee list, resumable after a crash:
+#   python batch_passes.py attendees.csv --processes 8
+#Every rendered chatID is appended to a journal (attendees.csv.journal by default),
+#running the same command again skips everything already in the journal.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from encoders import ENCODERS
+from generate_event_pass import render_passes
+from pyramid import parse_sizes
+
+RECORD_FIELDS = ['pillar', 'chatID', 'name', 'customAvatar', 'avatar_type', 'personal_interest']
+
+
+def jsonl_rows(lines, input_path):
+    # A bad line is skipped and reported, raising here would stop the batch at the same line on every resume
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            print(f"Skipping {input_path} line {line_number}, not valid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            print(f"Skipping {input_path} line {line_number}, not a JSON object")
+            continue
+        yield row
+
+
+def read_records(input_path):
+    """Yield pass records one at a time from a .csv (with header row) or .jsonl file."""
+    with open(input_path, newline='', encoding='utf-8') as f:
+        if input_path.lower().endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = jsonl_rows(f, input_path)
+        for row in rows:
+            # Empty CSV cells fall back to the create_event_pass defaults
+            record = {field: row[field] for field in RECORD_FIELDS if row.get(field) not in (None, '')}
+            if isinstance(record.get('customAvatar'), str):
+                record['customAvatar'] = record['customAvatar'].strip().lower() in ('1', 'true', 'yes')
+            if 'chatID' in record:
+                record['chatID'] = str(record['chatID'])
+            yield record
+
+
+def read_journal(journal_path):
+    if not os.path.exists(journal_path):
+        return set()
+    with open(journal_path, encoding='utf-8') as journal:
+        return {line.rstrip('\n') for line in journal if line.strip()}
+
+
+def pending_records(records, done):
+    for record in records:
+        if 'pillar' not in record or 'chatID' not in record:
+            print(f"Skipping record without pillar/chatID: {record}")
+        elif record['chatID'] not in done:
+            yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render event passes for a CSV/JSONL attendee list")
+    parser.add_argument("input", help="attendee list (.csv with a header row, or .jsonl)")
+    parser.add_argument("--journal", help="checkpoint journal (default: <input>.journal)")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--encoder", choices=ENCODERS, default="png", help="output format and compression settings")
+    parser.add_argument("--sizes", type=parse_sizes, default=None,
+                        help="also save scaled down copies, e.g. print=1,kiosk=2,preview=4 (name=reduction factor)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse and store passes in the render cache, for re-running a list (off: every pass is new)")
+    parser.add_argument("--warm-shells", action="store_true", help="pre-composite every random-avatar pass shell up front")
+    args = parser.parse_args()
+
+    journal_path = args.journal or args.input + ".journal"
+    done = read_journal(journal_path)
+    if done:
+        print(f"Resuming, {len(done)} passes already rendered")
+
+    records = pending_records(read_records(args.input), done)
+    start = time.perf_counter()
+    rendered = failed = 0
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        for record, output_path in render_passes(records, args.processes, encoder=args.encoder, sizes=args.sizes, cache=args.cache,
+                                                 warm_shells=args.warm_shells):
+            if output_path:
+                rendered += 1
+                # Flushed per row so a crash loses at most the passes still in flight
+                journal.write(record['chatID'] + '\n')
+                journal.flush()
+            else:
+                failed += 1
+            elapsed = time.perf_counter() - start
+            sys.stderr.write(f"\r{rendered} rendered, {failed} failed, {rendered / elapsed:.1f} rows/s")
+            sys.stderr.flush()
+    sys.stderr.write("\n")
+
+
+if __name__ == "__main__":
+    main()
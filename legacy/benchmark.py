@@ -0,0 +1,501 @@
+#Micro-benchmarks for the event pass pipeline, run from the legacy folder:
+#   python benchmark.py            (all cases)
+#   python benchmark.py templates  (selected cases)
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from PIL import Image, ImageDraw
+import qrcode
+
+import avatar_cache
+import base_layer
+import canvas_pool
+import comfy_files
+import comfy_http
+import compositor
+import encoders
+import masks
+import font_cache
+import qr_cache
+import pyramid
+import raw_store
+import render_cache
+import shell_cache
+import template_cache
+import text_cache
+
+
+def time_per_call(fn, repeat=20):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def report(case, before_ms, after_ms):
+    print(f"{case:<32} before {before_ms:8.2f} ms   after {after_ms:8.2f} ms   x{before_ms / after_ms:.1f}")
+
+
+def bench_templates():
+    template_path = template_cache.get_template_path("SUTD")
+
+    def before():
+        template = Image.open(template_path)
+        event_pass = Image.new('RGB', template.size, 'white')
+        event_pass.paste(template, (0, 0))
+
+    def after():
+        template_cache.get_template_canvas(template_path)
+
+    report("template load per pass", time_per_call(before), time_per_call(after))
+
+
+def bench_base_layer():
+    template_path = template_cache.get_template_path("SUTD")
+    base = base_layer.get_base_layer(template_path)
+    regions = base_layer.dirty_regions(base.width, *font_cache.get_pass_fonts())
+    canvas = base.copy()
+
+    def before():
+        base.copy()
+
+    def after():
+        base_layer.reset_dirty_regions(canvas, base, regions)
+
+    report("canvas per pass (dirty regions)", time_per_call(before), time_per_call(after))
+
+
+def bench_qr():
+    canvas = Image.new('RGB', (1080, 1920), 'white')
+    payload = qr_cache.qr_payload("123456789")
+    position = base_layer.qr_position(canvas.width)
+
+    def before():
+        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+        qr.add_data(payload)
+        qr.make(fit=True)
+        qr_img = qr.make_image(fill='black', back_color='white').resize(base_layer.QR_SIZE)
+        canvas.paste(qr_img, position)
+
+    def after_cold():
+        qr_cache.qr_matrix.cache_clear()
+        qr_cache.paste_qr(canvas, payload, position)
+
+    def after_reprint():
+        qr_cache.paste_qr(canvas, payload, position)
+
+    before_ms = time_per_call(before)
+    report("qr code, new payload", before_ms, time_per_call(after_cold))
+    report("qr code, reprint", before_ms, time_per_call(after_reprint))
+
+
+def bench_encoders():
+    # Real passes, one per pillar, encoded with every option
+    from generate_event_pass import PILLARS, compose_event_pass, pass_static_layout
+
+    random.seed(0)
+    passes = [compose_event_pass(pillar, f"benchmark_{pillar}", name="Alex Tan") for pillar in PILLARS]
+    layouts = [pass_static_layout(pillar) for pillar in PILLARS]
+
+    print(f"{'encoder':<20} {'encode ms':>10} {'KB':>8}")
+    for encoder in encoders.ENCODERS:
+        sizes = []
+
+        def encode():
+            for event_pass, layout in zip(passes, layouts):
+                buffer = BytesIO()
+                encoders.encode_pass(event_pass, buffer, encoder, layout)
+                sizes.append(buffer.tell())
+
+        encode_ms = time_per_call(encode, repeat=2) / len(passes)
+        print(f"{encoder:<20} {encode_ms:10.1f} {sum(sizes) / len(sizes) / 1024:8.0f}")
+
+
+def bench_avatar():
+    canvas = Image.new('RGB', (1080, 1920), 'white')
+    avatar_path = avatar_cache.sample_avatar_paths("Male")[0]
+
+    def before():
+        avatar_resized = Image.open(avatar_path).resize(base_layer.AVATAR_SIZE)
+        mask = Image.new('L', avatar_resized.size, 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, mask.size[0], mask.size[1]), fill=255)
+        output = Image.new('RGBA', avatar_resized.size, (0, 0, 0, 0))
+        output.paste(avatar_resized, (0, 0))
+        output.putalpha(mask)
+        canvas.paste(output, base_layer.AVATAR_POSITION, output)
+
+    def after():
+        avatar_layer = avatar_cache.load_circular_avatar(avatar_path)
+        canvas.paste(avatar_layer, base_layer.AVATAR_POSITION, avatar_layer)
+
+    report("sample avatar per pass", time_per_call(before), time_per_call(after))
+
+
+def bench_mask():
+    size = base_layer.AVATAR_SIZE
+    canvas = Image.new('RGB', (1080, 1920), 'white')
+    avatar = Image.new('RGB', size, 'red')
+
+    def before():
+        mask = Image.new('L', size, 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, size[0], size[1]), fill=255)
+        return mask
+
+    def after_cold():
+        masks.get_mask.cache_clear()
+        return masks.get_mask(size)
+
+    def after_cached():
+        return masks.get_mask(size)
+
+    before_ms = time_per_call(before)
+    report("mask create, anti-aliased", before_ms, time_per_call(after_cold))
+    report("mask create, cached", before_ms, time_per_call(after_cached))
+
+    jagged, smooth = before(), after_cached()
+    report("mask paste (jagged vs AA)",
+           time_per_call(lambda: canvas.paste(avatar, base_layer.AVATAR_POSITION, jagged)),
+           time_per_call(lambda: canvas.paste(avatar, base_layer.AVATAR_POSITION, smooth)))
+
+
+def bench_in_memory():
+    # Only the write + read-back differs, so use the fast encoder to keep it visible
+    from generate_event_pass import create_event_pass, render_event_pass
+
+    def before():
+        output_path, event_pass = create_event_pass("SUTD", "benchmark", encoder="png-fast")
+        with open(output_path, 'rb') as f:
+            f.read()
+        os.remove(output_path)
+
+    def after():
+        render_event_pass("SUTD", "benchmark", encoder="png-fast")
+
+    report("pass to bytes (disk vs memory)", time_per_call(before, repeat=10), time_per_call(after, repeat=10))
+
+
+def bench_text():
+    canvas = Image.new('RGB', (1080, 1920), 'white')
+    fonts = font_cache.get_pass_fonts()
+    lines = [("Alex Tan", base_layer.NAME_Y), ("Problem-solving analyst", base_layer.AVATAR_NAME_Y),
+             ('"Solving problems with precision and insight!"', base_layer.TAGLINE_Y)]
+
+    def before():
+        draw = ImageDraw.Draw(canvas)
+        for font, (text, y) in zip(fonts, lines):
+            text_bbox = draw.textbbox((0, 0), text, font=font)
+            draw.text(((canvas.width - (text_bbox[2] - text_bbox[0])) / 2, y), text, fill="black", font=font)
+
+    def after():
+        for font, (text, y) in zip(fonts, lines):
+            text_cache.paste_centered_text(canvas, text, font, y, pinned=True)
+
+    report("three text lines per pass", time_per_call(before), time_per_call(after))
+
+
+def bench_autofit():
+    name = "Alexandria Chua Wei Ling Tan Binte Abdullah"
+    font_name, max_size = font_cache.PASS_FONTS[0]
+
+    def before():
+        # Linear scan down from the full size, measuring the whole string each time
+        for size in range(max_size, text_cache.MIN_FONT_SIZE - 1, -1):
+            if font_cache.get_font(font_name, size).getlength(name) <= base_layer.TEXT_MAX_WIDTH:
+                return size
+
+    def after():
+        return text_cache.fit_font(name, font_name, max_size, base_layer.TEXT_MAX_WIDTH).size
+
+    report("auto-fit long name", time_per_call(before), time_per_call(after))
+
+
+def bench_composite():
+    # Blending the avatar, text and QR layers, given already prepared sources
+    canvas = Image.new('RGB', (1080, 1920), 'white')
+    avatar_layer = avatar_cache.load_circular_avatar(avatar_cache.sample_avatar_paths("Male")[0])
+    avatar_resized = avatar_layer.convert('RGB')
+    mask = masks.get_mask(base_layer.AVATAR_SIZE)
+    fonts = font_cache.get_pass_fonts()
+    lines = [("Alex Tan", base_layer.NAME_Y), ("Problem-solving analyst", base_layer.AVATAR_NAME_Y),
+             ('"Solving problems with precision and insight!"', base_layer.TAGLINE_Y)]
+    payload = qr_cache.qr_payload("123456789")
+    qr_position = base_layer.qr_position(canvas.width)
+    qr_img = Image.frombytes('L', base_layer.QR_SIZE, bytes(base_layer.QR_SIZE[0] * base_layer.QR_SIZE[1]))
+
+    def before():
+        # The original path: intermediate RGBA avatar, ImageDraw text, full QR image pasted
+        output = Image.new('RGBA', avatar_resized.size, (0, 0, 0, 0))
+        output.paste(avatar_resized, (0, 0))
+        output.putalpha(mask)
+        canvas.paste(output, base_layer.AVATAR_POSITION, output)
+        draw = ImageDraw.Draw(canvas)
+        for font, (text, y) in zip(fonts, lines):
+            text_bbox = draw.textbbox((0, 0), text, font=font)
+            draw.text(((canvas.width - (text_bbox[2] - text_bbox[0])) / 2, y), text, fill="black", font=font)
+        canvas.paste(qr_img, qr_position)
+
+    def after():
+        layers = [compositor.image_layer(avatar_layer, base_layer.AVATAR_POSITION)]
+        layers += [text_cache.centered_text_layer(text, font, y, canvas.width, pinned=True)
+                   for font, (text, y) in zip(fonts, lines)]
+        layers.append(qr_cache.qr_layer(payload, qr_position))
+        compositor.composite(canvas, layers)
+
+    report("composite avatar+text+qr", time_per_call(before), time_per_call(after))
+
+
+def bench_pool(passes=300):
+    from generate_event_pass import PILLARS, compose_event_pass
+
+    def run(pooled):
+        start = canvas_pool.memory_stats()
+        rss = []
+        for i in range(passes):
+            event_pass = compose_event_pass(PILLARS[i % len(PILLARS)], str(1000000 + i), name=f"Attendee {i}",
+                                            pooled=pooled)
+            if pooled:
+                canvas_pool.release_canvas(event_pass)
+            if (i + 1) % (passes // 3) == 0:
+                rss.append(canvas_pool.memory_stats()["peak_rss_kb"])
+        end = canvas_pool.memory_stats()
+        per_pass = {key: (end[key] - start[key]) / passes
+                    for key in ("images_created", "blocks_allocated", "canvases_allocated")}
+        print(f"{'pooled' if pooled else 'fresh':<8} per pass: {per_pass['images_created']:.1f} images, "
+              f"{per_pass['blocks_allocated']:.1f} blocks allocated, {per_pass['canvases_allocated']:.2f} canvases; "
+              f"peak RSS KB after each third: {rss}")
+
+    random.seed(0)
+    run(pooled=False)
+    canvas_pool.enable_block_reuse()
+    run(pooled=True)
+
+
+def bench_raw_store():
+    # Cold base layer load in a fresh worker: PNG decode vs mapping the raw store file
+    template_path = template_cache.get_template_path("SUTD")
+    base_layer.build_raw_base_layers()
+    source_mtime = os.stat(template_path).st_mtime_ns
+
+    def before():
+        template_cache.clear_template_cache()
+        base_layer.build_base_layer(template_cache.load_template(template_path))
+
+    def after():
+        raw_store._mapped.clear()
+        raw_store.map_raw(raw_store.raw_path_for(template_path), source_mtime, base_layer.BASE_LAYER_VERSION)
+
+    report("cold base layer load", time_per_call(before), time_per_call(after))
+
+
+def bench_splice():
+    # PNG encode of a full pass vs deflating only its dirty rows next to the pre-deflated static bands
+    from generate_event_pass import compose_event_pass, pass_static_layout
+
+    random.seed(0)
+    event_pass = compose_event_pass("SUTD", "benchmark_SUTD", name="Alex Tan")
+    layout = pass_static_layout("SUTD")
+
+    def before():
+        encoders.encode_pass(event_pass, BytesIO(), "png")
+
+    def after():
+        encoders.encode_pass(event_pass, BytesIO(), "png-spliced", layout)
+
+    report("PNG encode per pass", time_per_call(before, repeat=5), time_per_call(after, repeat=5))
+
+
+def bench_pyramid():
+    # Print, kiosk and preview outputs: reopening the saved PNG per size vs one reduce chain
+    from generate_event_pass import compose_event_pass
+
+    random.seed(0)
+    event_pass = compose_event_pass("SUTD", "benchmark_SUTD", name="Alex Tan")
+
+    def before():
+        saved = BytesIO()
+        event_pass.save(saved, "PNG")
+        for factor in pyramid.OUTPUT_SIZES.values():
+            with Image.open(BytesIO(saved.getvalue())) as reopened:
+                resized = reopened.resize((event_pass.width // factor, event_pass.height // factor))
+                resized.save(BytesIO(), "PNG")
+
+    def after():
+        pyramid.encode_pyramid(pyramid.build_pyramid(event_pass))
+
+    report("pass in 3 output sizes", time_per_call(before, repeat=3), time_per_call(after, repeat=3))
+
+
+def bench_render_cache():
+    # "Resend my pass": rendering the same pass again vs returning it from the render cache
+    from generate_event_pass import render_event_pass
+
+    def resend(cache):
+        render_event_pass("SUTD", "benchmark_SUTD", name="Alex Tan", cache=cache)
+
+    report("resend identical pass", time_per_call(lambda: resend(False), repeat=5),
+           time_per_call(lambda: resend(True), repeat=5))
+    print(f"render cache: {render_cache.render_cache_info()}")
+
+
+def bench_all_pillars():
+    # One attendee in every pillar: six create_event_pass-style renders vs shared attendee layers
+    from generate_event_pass import PILLARS, compose_event_pass, pass_static_layout, render_all_pillars
+
+    def before():
+        random.seed(0)
+        for pillar in PILLARS:
+            # Fresh avatar, text and QR work per pillar as six separate calls would do
+            avatar_cache._avatars.clear()
+            text_cache._recent.clear()
+            qr_cache.qr_matrix.cache_clear()
+            encoders.encode_pass(compose_event_pass(pillar, "benchmark_all", name="Alex Tan"), BytesIO(), "png",
+                                 pass_static_layout(pillar))
+
+    def after():
+        random.seed(0)
+        avatar_cache._avatars.clear()
+        text_cache._recent.clear()
+        qr_cache.qr_matrix.cache_clear()
+        render_all_pillars("benchmark_all", name="Alex Tan")
+
+    report("pass in all 6 pillars", time_per_call(before, repeat=2), time_per_call(after, repeat=2))
+
+
+def bench_shell():
+    # Random-avatar pass on a pooled canvas: avatar + 3 text lines + QR vs cached shell + name + QR
+    from generate_event_pass import (PILLARS, attendee_layers, compose_event_pass, get_pillar_template,
+                                     load_avatar_layer, pick_avatar, warm_pass_shells)
+
+    warm_pass_shells()
+    random.seed(0)
+    passes = [(pillar, pick_avatar()) for pillar in PILLARS for _ in range(10)]
+    canvases = {pillar: compose_event_pass(pillar, "benchmark", avatar=passes[0][1]) for pillar in PILLARS}
+
+    def before():
+        for i, (pillar, (avatar_name, tagline, avatar_path)) in enumerate(passes):
+            base = base_layer.get_base_layer(get_pillar_template(pillar))
+            regions = base_layer.dirty_regions(base.width, *font_cache.get_pass_fonts())
+            canvas = base_layer.reset_dirty_regions(canvases[pillar], base, regions)
+            compositor.composite(canvas, attendee_layers(f"walk_in_{i}", "Alex Tan", avatar_name, tagline,
+                                                         load_avatar_layer(avatar_path), base.width))
+
+    def after():
+        for i, (pillar, avatar) in enumerate(passes):
+            compose_event_pass(pillar, f"walk_in_{i}", name="Alex Tan", canvas=canvases[pillar], avatar=avatar)
+
+    report("compose walk-in pass", time_per_call(before, repeat=5) / len(passes), time_per_call(after, repeat=5) / len(passes))
+    print(f"shell cache: {shell_cache.shell_cache_info()}")
+
+
+class StandInComfyUI(BaseHTTPRequestHandler):
+    # Answers /prompt, /history/<id> and /view like a ComfyUI server would, with keep-alive
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+    image = b"\x89PNG" + bytes(64 * 1024)
+
+    def do_GET(self):
+        if self.path.startswith("/view"):
+            self.answer(self.image, "image/png")
+        else:
+            self.answer(json.dumps({"abc": {"outputs": {}}}).encode(), "application/json")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.answer(json.dumps({"prompt_id": "abc"}).encode(), "application/json")
+
+    def answer(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_comfy_http():
+    # The three HTTP calls of a custom avatar against a local stand-in server: urlopen vs pooled keep-alive
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInComfyUI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    prompt = json.dumps({"prompt": {}, "client_id": "benchmark"}).encode()
+
+    def before():
+        urllib.request.urlopen(urllib.request.Request(f"http://{host}/prompt", data=prompt)).read()
+        urllib.request.urlopen(f"http://{host}/history/abc").read()
+        urllib.request.urlopen(f"http://{host}/view?filename=a.png").read()
+
+    def after():
+        comfy_http.http_request("POST", host, "/prompt", prompt, {"Content-Type": "application/json"})
+        comfy_http.http_request("GET", host, "/history/abc")
+        comfy_http.http_request("GET", host, "/view?filename=a.png")
+
+    report("3 ComfyUI calls, local server", time_per_call(before, repeat=200), time_per_call(after, repeat=200))
+    print(f"comfy_http: {comfy_http.http_stats()}")
+    comfy_http.close_connections()
+    server.shutdown()
+    server.server_close()
+
+
+def bench_comfy_files():
+    # Fetching a saved avatar: /view over a pooled connection vs reading ComfyUI's output folder directly
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInComfyUI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory() as comfyui_root:
+        os.makedirs(os.path.join(comfyui_root, "output"))
+        with open(os.path.join(comfyui_root, "output", "a.png"), 'wb') as f:
+            f.write(StandInComfyUI.image)
+        comfy_files.COMFYUI_ROOT = comfyui_root
+
+        def before():
+            comfy_http.http_request("GET", host, "/view?filename=a.png&subfolder=&type=output")
+
+        def after():
+            assert comfy_files.read_output_image("a.png", "", "output") == StandInComfyUI.image
+
+        report("read 64 KB avatar image", time_per_call(before, repeat=200), time_per_call(after, repeat=200))
+        comfy_files.COMFYUI_ROOT = None
+    print(f"comfy_files: {comfy_files.read_stats()}")
+    comfy_http.close_connections()
+    server.shutdown()
+    server.server_close()
+
+
+CASES = {
+    "templates": bench_templates,
+    "base": bench_base_layer,
+    "qr": bench_qr,
+    "avatar": bench_avatar,
+    "mask": bench_mask,
+    "memory": bench_in_memory,
+    "text": bench_text,
+    "autofit": bench_autofit,
+    "composite": bench_composite,
+    "pool": bench_pool,
+    "raw": bench_raw_store,
+    "splice": bench_splice,
+    "pyramid": bench_pyramid,
+    "rendercache": bench_render_cache,
+    "allpillars": bench_all_pillars,
+    "shell": bench_shell,
+    "comfyhttp": bench_comfy_http,
+    "comfyfiles": bench_comfy_files,
+    "encoders": bench_encoders,
+}
+
+if __name__ == "__main__":
+    for case in sys.argv[1:] or CASES:
+        CASES[case]()
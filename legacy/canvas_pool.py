@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import threading
+import weakref
+
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from base_layer import reset_dirty_regions
+
+# Spare canvases kept per base layer, one per in-flight pass is enough for a worker
+MAX_FREE_CANVASES = 2
+# Base layers with spare canvases, older ones (reloaded templates) are dropped first
+MAX_POOLED_BASES = 16
+# Freed Pillow memory blocks kept for reuse by the per-pass scratch images (QR, text and avatar masks)
+BLOCKS_MAX = 64
+# Handed out / drawn canvases remembered with their base layer, dead entries are pruned past this many
+MAX_MARKED_CANVASES = 64
+
+_free = OrderedDict()  # id(base) -> (base, [spare canvases])
+_owners = {}  # id(canvas) -> (weak reference to the canvas, base), for canvases handed out by acquire_canvas
+_drawn = {}  # id(canvas) -> (weak reference to the canvas, base it was drawn from), see mark_canvas
+_stats = {"canvases_allocated": 0, "canvases_reused": 0}
+_lock = threading.Lock()
+
+
+def acquire_canvas(base, regions):
+    """A canvas showing base, reused from the pool when possible - hand it back with release_canvas.
+
+    A reused canvas only gets its dirty regions restored from the base instead of a full copy.
+    """
+    with _lock:
+        entry = _free.get(id(base))
+        canvas = entry[1].pop() if entry is not None and entry[0] is base and entry[1] else None
+        _stats["canvases_reused" if canvas is not None else "canvases_allocated"] += 1
+    if canvas is None:
+        canvas = base.copy()
+    else:
+        reset_dirty_regions(canvas, base, regions)
+    with _lock:
+        _remember(_owners, canvas, base)
+    return canvas
+
+
+def release_canvas(canvas):
+    # The canvas must not be used by the caller afterwards, the next pass draws over it
+    with _lock:
+        entry = _owners.get(id(canvas))
+        # The weak reference tells a reused id of a collected canvas apart
+        if entry is None or entry[0]() is not canvas:
+            return
+        del _owners[id(canvas)]
+        base = entry[1]
+        entry = _free.get(id(base))
+        if entry is None or entry[0] is not base:
+            entry = _free[id(base)] = (base, [])
+            while len(_free) > MAX_POOLED_BASES:
+                _free.popitem(last=False)
+        if len(entry[1]) < MAX_FREE_CANVASES:
+            entry[1].append(canvas)
+
+
+def _remember(canvases, canvas, base):
+    # Caller holds _lock. Keyed by id without keeping the canvas alive, entries of collected canvases are dropped
+    if len(canvases) >= MAX_MARKED_CANVASES:
+        for key in [key for key, (ref, _) in canvases.items() if ref() is None]:
+            del canvases[key]
+    canvases[id(canvas)] = (weakref.ref(canvas), base)
+
+
+def mark_canvas(canvas, base):
+    # Remembers that canvas shows base outside the dirty regions
+    with _lock:
+        _remember(_drawn, canvas, base)
+
+
+def canvas_matches(canvas, base):
+    """True if canvas was marked with this very base layer, so resetting its dirty regions restores base.
+
+    All pillars have the same size, a size check alone would accept another pillar's pass.
+    """
+    with _lock:
+        entry = _drawn.get(id(canvas))
+    # The weak reference tells a reused id of a collected canvas apart
+    return entry is not None and entry[0]() is canvas and entry[1] is base
+
+
+def enable_block_reuse(blocks_max=BLOCKS_MAX):
+    # Pillow frees image memory straight away by default, keeping blocks lets temporaries reuse them
+    Image.core.set_blocks_max(max(blocks_max, Image.core.get_blocks_max()))
+
+
+def memory_stats():
+    """Counters for checking that long-running workers stay flat.
+
+    images_created / blocks_allocated come from Pillow's allocator, peak_rss_kb from the OS
+    (None on Windows, bytes rather than KB on macOS).
+    """
+    pillow = Image.core.get_stats()
+    with _lock:
+        stats = dict(_stats)
+    stats.update(
+        images_created=pillow["new_count"],
+        blocks_allocated=pillow["allocated_blocks"],
+        blocks_reused=pillow["reused_blocks"],
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+    )
+    return stats
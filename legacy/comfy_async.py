@@ -0,0 +1,255 @@
+#asyncio ComfyUI client: one long-lived /ws?clientId= connection per process, shared by every prompt.
+#A reader thread receives the websocket messages and routes them by prompt_id to the asyncio future
+#of the prompt waiting for them, so many attendee avatars can be awaited at once, e.g.
+#   avatars = await asyncio.gather(*(get_custom_avatar_async("Male", interest) for interest in interests))
+
+from collections import OrderedDict
+import asyncio
+import json
+import threading
+import uuid
+
+import websocket  #NOTE: websocket-client, already used by websocket_comfyUI
+
+import websocket_comfyUI as comfyui
+
+# Websocket connect timeout in seconds, reads then block until a message arrives
+CONNECT_TIMEOUT = 10
+# Messages for prompts nobody waits for (yet), kept in case the server answered before the waiter registered
+MAX_UNCLAIMED = 256
+# Seconds between /history polls for a prompt whose websocket messages were lost with the connection
+HISTORY_POLL_INTERVAL = 1
+
+_ws = None
+_waiters = {}  # prompt_id -> {"loop", "future", "outputs", "output_nodes", "cached", "frames", "on_progress"}
+_unclaimed = OrderedDict()  # prompt_id -> {"outputs", "cached_nodes", "frames", "done", "error"}
+_executing = (None, None)  # (prompt_id, node) ComfyUI runs now, binary frames carry no prompt_id
+_lock = threading.Lock()
+
+
+def _resolve(waiter, error=None):
+    # Called from the reader thread, a future may only be completed on its own event loop
+    def complete():
+        if waiter["future"].done():
+            return
+        if error is None:
+            waiter["future"].set_result(waiter["outputs"])
+        else:
+            waiter["future"].set_exception(error)
+    waiter["loop"].call_soon_threadsafe(complete)
+
+
+def _prompt_error(prompt_id, error):
+    return RuntimeError(f"ComfyUI prompt {prompt_id} failed: {error}")
+
+
+def _unclaimed_entry(prompt_id):
+    # Caller holds _lock
+    entry = _unclaimed.get(prompt_id)
+    if entry is None:
+        entry = _unclaimed[prompt_id] = {"outputs": {}, "cached_nodes": set(), "frames": [], "done": False, "error": None}
+        while len(_unclaimed) > MAX_UNCLAIMED:
+            _unclaimed.popitem(last=False)
+    return entry
+
+
+def _dispatch(message):
+    global _executing
+    data = message.get("data") or {}
+    prompt_id = data.get("prompt_id")
+    if prompt_id is None:
+        return  # status broadcasts, queue sizes
+    kind = message.get("type")
+    if kind == "executing":
+        with _lock:
+            _executing = (prompt_id, data.get("node"))
+    finished = kind == "executing" and data.get("node") is None
+    failed = kind in ("execution_error", "execution_interrupted")
+    if not (finished or failed or kind in ("executed", "execution_cached", "progress")):
+        return
+
+    with _lock:
+        waiter = _waiters.get(prompt_id)
+        record = waiter if waiter is not None else None if kind == "progress" else _unclaimed_entry(prompt_id)
+        if record is None:
+            return
+        if kind == "executed":
+            record["outputs"][data["node"]] = data.get("output") or {}
+        elif kind == "execution_cached" and data.get("nodes"):
+            # Cached output nodes send no "executed" message, their outputs are only in /history
+            if waiter is None:
+                record["cached_nodes"].update(data["nodes"])
+            elif waiter["output_nodes"] & set(data["nodes"]):
+                record["cached"] = True
+        if waiter is None:
+            # Nobody waits for this id yet, run_prompt picks the entry up once it learns the id
+            record["done"] = record["done"] or finished or failed
+            if failed:
+                record["error"] = data.get("exception_message", kind)
+            return
+        if finished or failed:
+            del _waiters[prompt_id]
+
+    if finished:
+        if waiter["frames"]:
+            waiter["outputs"] = {comfyui.WS_OUTPUT_NODE: waiter["frames"]}
+        _resolve(waiter)
+    elif failed:
+        _resolve(waiter, _prompt_error(prompt_id, data.get("exception_message", kind)))
+    elif kind == "progress" and waiter["on_progress"] is not None:
+        waiter["loop"].call_soon_threadsafe(waiter["on_progress"], data.get("value"), data.get("max"))
+
+
+def _dispatch_frame(out):
+    # Binary frames are latent previews, except those sent while the websocket output node runs
+    with _lock:
+        prompt_id, node = _executing
+        if node != comfyui.WS_OUTPUT_NODE:
+            return
+        record = _waiters.get(prompt_id) or _unclaimed_entry(prompt_id)
+        record["frames"].append(comfyui.ws_image_frame(out))
+
+
+def _read_messages(ws):
+    global _ws
+    error = "closed by ComfyUI"
+    try:
+        while True:
+            out = ws.recv()
+            if out == "":
+                break  # recv() answers a close frame itself and returns ""
+            if isinstance(out, str):
+                _dispatch(json.loads(out))
+            else:
+                _dispatch_frame(out)
+    except Exception as e:
+        # Connection errors, and also a message this client cannot parse: the reader stops either way
+        error = e
+    finally:
+        ws.shutdown()
+        with _lock:
+            if _ws is ws:
+                _ws = None
+            waiters = list(_waiters.values())
+            _waiters.clear()
+        # Prompts in flight cannot be followed any more, fail them instead of waiting forever
+        for waiter in waiters:
+            _resolve(waiter, ConnectionError(f"ComfyUI websocket closed: {error}"))
+
+
+def _connect():
+    global _ws
+    with _lock:
+        if _ws is not None:
+            return
+    # Connecting can block for CONNECT_TIMEOUT, run_prompt takes _lock on the event loop thread
+    ws = websocket.WebSocket()
+    ws.connect("ws://{}/ws?clientId={}".format(comfyui.server_address, comfyui.client_id), timeout=CONNECT_TIMEOUT)
+    ws.settimeout(None)
+    with _lock:
+        won = _ws is None
+        if won:
+            _ws = ws
+    if not won:
+        ws.abort()  # another thread connected meanwhile, keep the one websocket
+        ws.shutdown()
+        return
+    threading.Thread(target=_read_messages, args=(ws,), name="comfyui-websocket", daemon=True).start()
+
+
+async def connect_websocket():
+    """Open the shared websocket unless it is open already, run_prompt does this on demand."""
+    await asyncio.get_running_loop().run_in_executor(None, _connect)
+
+
+def close_websocket():
+    # Prompts still in flight then switch to polling /history
+    with _lock:
+        ws = _ws
+    if ws is not None:
+        # close() would wait for the server's reply on the socket the reader thread is reading,
+        # abort() wakes the reader up straight away and it releases the socket
+        ws.abort()
+
+
+async def run_prompt(prompt, on_progress=None, timeout=None):
+    """Queue a workflow and wait for it to finish without blocking the event loop.
+
+    Returns (prompt_id, {node_id: output}) with the outputs of the prompt's "executed" messages, read from
+    /history instead if the websocket dropped meanwhile. The outputs are {} when ComfyUI served an output
+    node from its cache, as those send no messages - comfyui.get_output_images then asks /history.
+    A prompt ending in comfyui.WS_OUTPUT_NODE returns {WS_OUTPUT_NODE: [image bytes]} from its binary frames.
+    on_progress(value, max) is called on the event loop for each "progress" message of the prompt.
+    Raises RuntimeError if ComfyUI reports an error and asyncio.TimeoutError after timeout seconds.
+    """
+    loop = asyncio.get_running_loop()
+    await connect_websocket()
+    prompt_id = str(uuid.uuid4())
+    waiter = {"loop": loop, "future": loop.create_future(), "outputs": {}, "output_nodes": comfyui.prompt_output_nodes(prompt),
+              "cached": False, "frames": [], "on_progress": on_progress}
+    with _lock:
+        _waiters[prompt_id] = waiter
+    try:
+        # Listening before queueing, so a prompt ComfyUI answers from its cache straight away is not missed
+        answer = await loop.run_in_executor(None, comfyui.queue_prompt, prompt, prompt_id)
+        if answer["prompt_id"] != prompt_id:
+            # Older servers ignore the requested id and pick their own
+            with _lock:
+                _waiters.pop(prompt_id, None)
+                prompt_id = answer["prompt_id"]
+                entry = _unclaimed.pop(prompt_id, None)
+                if entry is not None:
+                    waiter["outputs"].update(entry["outputs"])
+                    waiter["cached"] = bool(waiter["output_nodes"] & entry["cached_nodes"])
+                    waiter["frames"].extend(entry["frames"])
+                    if entry["done"] and waiter["frames"]:
+                        waiter["outputs"] = {comfyui.WS_OUTPUT_NODE: waiter["frames"]}
+                if entry is None or not entry["done"]:
+                    _waiters[prompt_id] = waiter
+            if entry is not None and entry["done"]:
+                _resolve(waiter, _prompt_error(prompt_id, entry["error"]) if entry["error"] else None)
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            outputs = await asyncio.wait_for(waiter["future"], timeout)
+        except ConnectionError:
+            # The prompt keeps running on the server, only its messages are lost: follow it through /history
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            return prompt_id, await asyncio.wait_for(_poll_history(prompt_id), remaining)
+        return prompt_id, {} if waiter["cached"] and not waiter["frames"] else outputs
+    finally:
+        with _lock:
+            _waiters.pop(prompt_id, None)
+
+
+async def _poll_history(prompt_id):
+    # {node_id: output} once the prompt shows up in /history as finished
+    loop = asyncio.get_running_loop()
+    while True:
+        history = await loop.run_in_executor(None, comfyui.get_history, prompt_id)
+        entry = history.get(prompt_id)
+        if entry is not None:
+            status = entry.get("status") or {}
+            if status.get("status_str") == "error":
+                raise _prompt_error(prompt_id, "see /history")
+            return entry.get("outputs") or {}
+        await asyncio.sleep(HISTORY_POLL_INTERVAL)
+
+
+async def get_custom_avatar_async(avatar_type, personal_interest, on_progress=None, timeout=None, websocket_output=None):
+    """get_custom_avatar for asyncio callers, any number can be in flight over the one websocket.
+
+    Returns (avatar_name, tagline, avatar_path) like get_custom_avatar, with the PNG bytes in place of
+    avatar_path when websocket_output (default comfyui.WEBSOCKET_OUTPUT) is on.
+    """
+    loop = asyncio.get_running_loop()
+    if websocket_output is None:
+        websocket_output = comfyui.WEBSOCKET_OUTPUT
+    prompt = comfyui.build_avatar_prompt(avatar_type, personal_interest, websocket_output)
+    prompt_id, outputs = await run_prompt(prompt, on_progress, timeout)
+    if websocket_output:
+        # Raises RuntimeError if the frames were lost with the websocket, the node saves no file to fall back on
+        return comfyui.avatar_from_frames(outputs, avatar_type, personal_interest)
+    # Blocking HTTP calls run on the default executor, over comfy_http's shared connections.
+    # The image filenames come from the "executed" messages, so this is only the image download
+    images = await loop.run_in_executor(None, comfyui.get_output_images, prompt_id, outputs)
+    return await loop.run_in_executor(None, comfyui.save_avatar_images, images, avatar_type, personal_interest)
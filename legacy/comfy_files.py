@@ -0,0 +1,57 @@
+#Same-host reads of ComfyUI images: when the renderer runs on the ComfyUI machine, the file named in an
+#"executed" message is already on this disk, so it is mapped straight from ComfyUI's folders instead of
+#downloaded through /view. Anything not visible from here still goes over HTTP (see websocket_comfyUI.get_image).
+
+import mmap
+import os
+import threading
+
+# ComfyUI install folder holding output/, input/ and temp/, e.g.
+# "D:\ComfyUI_windows_portable_nvidia\ComfyUI_windows_portable\ComfyUI". None reads everything over HTTP
+COMFYUI_ROOT = None
+# Folder of each image "type", relative to COMFYUI_ROOT or absolute (ComfyUI's --output-directory)
+OUTPUT_FOLDERS = {"output": "output", "input": "input", "temp": "temp"}
+
+_stats = {"direct_reads": 0, "http_reads": 0}
+_lock = threading.Lock()
+
+
+def output_path(filename, subfolder="", folder_type="output"):
+    """Local path of a ComfyUI image from its (filename, subfolder, type), None if it is not visible here."""
+    folder = OUTPUT_FOLDERS.get(folder_type)
+    if COMFYUI_ROOT is None or folder is None:
+        return None
+    root = os.path.realpath(os.path.join(COMFYUI_ROOT, folder))
+    path = os.path.realpath(os.path.join(root, subfolder or "", filename))
+    # Like ComfyUI's /view, names from a message may not point outside the folder
+    if os.path.commonpath((root, path)) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def read_mapped(path):
+    # The file's bytes copied once out of the page cache, without read()'s intermediate buffers
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # an empty file cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:]
+
+
+def read_output_image(filename, subfolder="", folder_type="output"):
+    """Bytes of a ComfyUI image read from disk, None when the caller has to fetch it over HTTP."""
+    path = output_path(filename, subfolder, folder_type)
+    data = None
+    if path is not None:
+        try:
+            data = read_mapped(path)
+        except (OSError, ValueError) as e:
+            print(f"Reading {path} directly failed, using HTTP: {e}")
+    with _lock:
+        _stats["direct_reads" if data is not None else "http_reads"] += 1
+    return data
+
+
+def read_stats():
+    with _lock:
+        return dict(_stats)
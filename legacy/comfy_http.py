@@ -0,0 +1,91 @@
+#Keep-alive HTTP connections shared by every ComfyUI call, so a custom avatar costs one TCP handshake
+#instead of one per request (queue the prompt, read the history, download each image).
+
+import http.client
+import threading
+import urllib.error
+
+# Seconds to wait for a connection or for each read, per request unless the caller passes its own
+REQUEST_TIMEOUT = 30
+# Idle connections kept per server, more only exist while that many requests run at once
+MAX_IDLE_CONNECTIONS = 4
+
+_idle = {}  # host:port -> [idle HTTPConnection], most recently used last
+_stats = {"requests": 0, "connections_opened": 0, "connections_reused": 0, "retries": 0}
+_lock = threading.Lock()
+
+# A server may close an idle keep-alive connection at any time, these mean that happened before it answered
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, BrokenPipeError,
+                            ConnectionResetError, ConnectionAbortedError)
+
+
+def _checkout(host, timeout):
+    with _lock:
+        idle = _idle.get(host)
+        connection = idle.pop() if idle else None
+        _stats["connections_reused" if connection is not None else "connections_opened"] += 1
+    if connection is None:
+        return http.client.HTTPConnection(host, timeout=timeout), False
+    connection.timeout = timeout
+    if connection.sock is not None:
+        connection.sock.settimeout(timeout)
+    return connection, True
+
+
+def _checkin(host, connection):
+    with _lock:
+        idle = _idle.setdefault(host, [])
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(connection)
+            return
+    connection.close()
+
+
+def http_request(method, host, path, body=None, headers=None, timeout=REQUEST_TIMEOUT):
+    """Send one request over a pooled keep-alive connection to host ("127.0.0.1:8188").
+
+    Returns (response headers, response body bytes). Raises urllib.error.HTTPError for 4xx/5xx answers,
+    like urllib.request.urlopen, and OSError / http.client.HTTPException when the server is unreachable.
+    A request on a reused connection that the server had already closed is retried once on a new one.
+    """
+    with _lock:
+        _stats["requests"] += 1
+    while True:
+        connection, reused = _checkout(host, timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            data = response.read()
+        except _STALE_CONNECTION_ERRORS:
+            connection.close()
+            if not reused:
+                raise
+            with _lock:
+                _stats["retries"] += 1
+            continue
+        except BaseException:
+            connection.close()
+            raise
+        break
+
+    if response.will_close:
+        connection.close()
+    else:
+        _checkin(host, connection)
+    if response.status >= 400:
+        raise urllib.error.HTTPError(f"http://{host}{path}", response.status, response.reason, response.headers, None)
+    return response.headers, data
+
+
+def close_connections():
+    with _lock:
+        connections = [connection for idle in _idle.values() for connection in idle]
+        _idle.clear()
+    for connection in connections:
+        connection.close()
+
+
+def http_stats():
+    # Connection reuse counters, connections_reused / requests is the share of requests without a handshake
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,25 @@
+# A layer is (source, position, mask): source is an image or a fill colour and mask an 'L' image,
+# or the RGBA source itself to use its alpha. Pillow blends each layer straight into the canvas
+# buffer, so every dirty pixel is written once and no intermediate full-size image is made.
+
+
+def image_layer(image, position):
+    # RGBA image blended through its own alpha, e.g. the circular avatar
+    return (image, position, image)
+
+
+def tile_layer(image, position):
+    # Opaque image copied over the canvas as is, e.g. a pre-composited shell tile
+    return (image, position, None)
+
+
+def fill_layer(color, position, mask):
+    # Solid colour through a coverage mask, e.g. text glyphs or QR modules
+    return (color, position, mask)
+
+
+def composite(canvas, layers):
+    """Blend the layers onto the canvas in place, in order, and return the canvas."""
+    for source, position, mask in layers:
+        canvas.paste(source, position, mask)
+    return canvas
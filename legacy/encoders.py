@@ -0,0 +1,56 @@
+import zlib
+
+from PIL import Image, PngImagePlugin
+
+from png_splice import save_spliced_png
+
+# Encoder name -> Pillow save options, "colors" quantizes the pass to a palette before saving.
+# Pillow always picks PNG row filters adaptively, so the PNG variants differ in zlib level and strategy.
+# "spliced" reuses the pre-deflated static rows of the pillar (see png_splice.py) when the base layer is known.
+ENCODERS = {
+    "png": {"format": "PNG"},  # Pillow defaults, what FinalPass has used so far
+    "png-fast": {"format": "PNG", "compress_level": 1},
+    "png-max": {"format": "PNG", "compress_level": 9},
+    "png-rle": {"format": "PNG", "compress_level": 6, "compress_type": zlib.Z_RLE},
+    "png-filtered": {"format": "PNG", "compress_level": 6, "compress_type": zlib.Z_FILTERED},
+    "png-spliced": {"format": "PNG", "compress_level": 6, "spliced": True},
+    "png-palette": {"format": "PNG", "colors": 256},
+    "webp-lossless": {"format": "WEBP", "lossless": True, "quality": 0, "method": 0},
+    "webp-lossless-max": {"format": "WEBP", "lossless": True, "quality": 100, "method": 4},
+    "webp": {"format": "WEBP", "quality": 90, "method": 4},
+    "webp-small": {"format": "WEBP", "quality": 80, "method": 6},
+}
+
+EXTENSIONS = {"PNG": ".png", "WEBP": ".webp"}
+
+
+def get_encoder_options(encoder):
+    try:
+        return dict(ENCODERS[encoder])
+    except KeyError:
+        raise ValueError(f"Unknown encoder {encoder!r}, choose from {', '.join(ENCODERS)}") from None
+
+
+def encoder_extension(encoder):
+    return EXTENSIONS[get_encoder_options(encoder)["format"]]
+
+
+def encode_pass(event_pass, fp, encoder="png", static=None, text=None):
+    """Save the pass to a path or file object with the named encoder settings.
+
+    static: optional (base layer, dirty regions) the pass was drawn from, used by spliced encoders.
+    text: optional {keyword: value} written as PNG text chunks, ignored by other formats.
+    """
+    options = get_encoder_options(encoder)
+    spliced = options.pop("spliced", False)
+    if spliced and static is not None and event_pass.mode == 'RGB' and event_pass.size == static[0].size:
+        save_spliced_png(event_pass, fp, *static, compress_level=options["compress_level"], text=text)
+        return
+    colors = options.pop("colors", None)
+    if colors:
+        event_pass = event_pass.quantize(colors, method=Image.Quantize.FASTOCTREE)
+    if text and options["format"] == "PNG":
+        options["pnginfo"] = PngImagePlugin.PngInfo()
+        for keyword, value in text.items():
+            options["pnginfo"].add_text(keyword, value)
+    event_pass.save(fp, **options)
@@ -0,0 +1,57 @@
+from io import BytesIO
+import os
+import threading
+
+from PIL import ImageFont
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Fonts used on the pass: (font file, size)
+PASS_FONTS = [("Garet-Heavy.ttf", 45), ("Garet-Heavy.ttf", 35), ("Garet-Book.ttf", 42)]
+
+_font_bytes = {}  # font_path -> raw font file bytes, shared by every size
+_fonts = {}  # (font_path, size, layout_engine) -> FreeTypeFont
+_lock = threading.Lock()
+
+
+def resolve_font_path(font_name):
+    # Relative font names are looked up next to the scripts, not in the CWD
+    if os.path.isabs(font_name):
+        return font_name
+    return os.path.join(script_dir, font_name)
+
+
+def load_font_bytes(font_name):
+    font_path = resolve_font_path(font_name)
+    with _lock:
+        font_bytes = _font_bytes.get(font_path)
+    if font_bytes is None:
+        # Raises IOError with the resolved path when the font is missing
+        with open(font_path, 'rb') as f:
+            font_bytes = f.read()
+        with _lock:
+            font_bytes = _font_bytes.setdefault(font_path, font_bytes)
+    return font_bytes
+
+
+def get_font(font_name, size, layout_engine=None):
+    """Return a cached FreeTypeFont, the font file is only read once for all sizes."""
+    key = (resolve_font_path(font_name), size, layout_engine)
+    with _lock:
+        font = _fonts.get(key)
+    if font is None:
+        # BytesIO hands the same bytes object to FreeType, so sizes share one buffer
+        font = ImageFont.truetype(BytesIO(load_font_bytes(font_name)), size, layout_engine=layout_engine)
+        with _lock:
+            font = _fonts.setdefault(key, font)
+    return font
+
+
+def get_pass_fonts(layout_engine=None):
+    # name, avatar name and tagline fonts
+    return [get_font(font_name, size, layout_engine) for font_name, size in PASS_FONTS]
+
+
+def preload_fonts(fonts=PASS_FONTS, layout_engine=None):
+    # Call in the parent before starting a worker pool so forked workers inherit the fonts
+    return [get_font(font_name, size, layout_engine) for font_name, size in fonts]
@@ -1,6 +1,9 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import random
 import qrcode
+from font_cache import get_pass_fonts
+from avatar_cache import make_circular_avatar
+from text_cache import paste_centered_text
 
 def create_event_pass(chatID, avatar_path, template_path="TEMPLATE_Reference.png"):
     # Load the template and avatar
@@ -17,54 +20,29 @@ def create_event_pass(chatID, avatar_path, template_path="TEMPLATE_Reference.png
     event_pass.paste(template, (0, 0))
 
 
-    # Resize avatar
-    avatar_resized = avatar.resize((420, 420))
-    
-    # Create circular mask
-    mask = Image.new('L', avatar_resized.size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, mask.size[0], mask.size[1]), fill=255)
-    
-    # Apply mask to avatar
-    output = Image.new('RGBA', avatar_resized.size, (0, 0, 0, 0))
-    output.paste(avatar_resized, (0, 0))
-    output.putalpha(mask)
+    # Resize avatar and apply the shared anti-aliased circular mask
+    output = make_circular_avatar(avatar, (420, 420))
     
     # Paste onto event pass
     event_pass.paste(output, (330, 666), output)
     
     # Add text elements
-    draw = ImageDraw.Draw(event_pass)
-
     names = ["Alex Tan"]
     taglines = ["Eco Warrior! 🌍"]
     name = random.choice(names)
     tagline = random.choice(taglines)
 
-    # Load a font
+    # Load fonts, parsed once per process and resolved next to this script
     try:
-        name_font = ImageFont.truetype("Garet-Heavy.ttf", 45)
-        avatar_font = ImageFont.truetype("Garet-Heavy.ttf", 35)
-        catchphrase_font = ImageFont.truetype("Garet-Book.ttf", 42)
-    except IOError:
-        print("Font file not found. Using default font.")
-        font = ImageFont.load_default(50)
-        print('font',font)
-    
-    # Function to draw right centered text
-    def draw_right_centered_text(draw, text, font, y, image_width):
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        x = ((image_width - text_width) / 2 ) #+ 240
-        text_position = (x, y)
-
-        # Draw the text
-        draw.text(text_position, text, fill="black", font=font)
+        name_font, avatar_font, catchphrase_font = get_pass_fonts()
+    except IOError as e:
+        print(f"Error loading fonts: {e}")
+        return None
 
-    # Add centered text to pass
-    draw_right_centered_text(draw, name, name_font, 1132, pass_width)
-    draw_right_centered_text(draw, "Sustainable Cat", avatar_font, 1299, pass_width)
-    draw_right_centered_text(draw, f'"{tagline}"', catchphrase_font, 1369, pass_width)
+    # Add centered text to pass, the fixed strings reuse their cached layers on every pass
+    paste_centered_text(event_pass, name, name_font, 1132, pinned=True)
+    paste_centered_text(event_pass, "Sustainable Cat", avatar_font, 1299, pinned=True)
+    paste_centered_text(event_pass, f'"{tagline}"', catchphrase_font, 1369, pinned=True)
 
     # Generate QR code
     qr_data = "SUTD_OH2025_" + chatID
@@ -1,126 +1,474 @@
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import argparse
+import glob
+import json
+import multiprocessing
 import os
-from websocket_comfyUI import get_custom_avatar, get_random_avatar
+import queue
+import time
+from websocket_comfyUI import AVATAR_NAMES, TAGLINES, get_custom_avatar, get_random_avatar
+from template_cache import get_template_path
+from base_layer import (AVATAR_NAME_Y, AVATAR_POSITION, AVATAR_SIZE, BASE_LAYER_VERSION, NAME_Y, TAGLINE_Y, TEXT_MAX_WIDTH,
+                        dirty_regions, get_base_layer, qr_position, reset_dirty_regions)
+from qr_cache import qr_layer, qr_payload
+from text_cache import fitted_text_layer
+from compositor import composite, image_layer, tile_layer
+from shell_cache import get_shell_tiles
+from canvas_pool import acquire_canvas, canvas_matches, enable_block_reuse, mark_canvas, release_canvas
+from font_cache import PASS_FONTS, get_pass_fonts, preload_fonts
+from avatar_cache import load_circular_avatar, make_circular_avatar, preload_sample_avatars
+from assets import asset_dir
+from encoders import ENCODERS, encode_pass, encoder_extension, get_encoder_options
+from render_cache import HASH_TEXT_KEY, cached_render, file_digest, forget_render, render_key, store_render
+from pyramid import OUTPUT_SIZES, build_pyramid, encode_pyramid, parse_sizes
+
+PILLARS = ['ASD', 'CSD', 'DAI', 'EPD', 'ESD', 'SUTD']
 
 
 def get_pillar_template(pillar):
-    script_dir = os.path.dirname(__file__)
-    template_base_path = os.path.join(script_dir, "Templates\\")
-    template_path = template_base_path + f"{pillar}_TEMPLATE.png"
-    
+    template_path = get_template_path(pillar)
+
     return template_path
 
     # mapPillarToTemplate = {'ASD': template_base_path+"ASD_TEMPLATE.png", 'EPD': template_base_path+"EPD_TEMPLATE.png", 'ESD': template_base_path+"ESD_TEMPLATE.png", 'DAI': template_base_path+"DAI_TEMPLATE.png", 'CSD': template_base_path+"CSD_TEMPLATE.png", 'SUTD': template_base_path+"SUTD_TEMPLATE.png"}
 
-def create_event_pass(pillar, chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None):
-    template_path = get_pillar_template(pillar)
+def pick_avatar(customAvatar=False, avatar_type="Male", personal_interest=None, chatID=None):
+    # (avatar name, tagline, avatar image path), custom avatars are generated by ComfyUI
+    # chatID: random avatars are then picked the same way on every render of the attendee's pass,
+    # so a resend matches the render cache
     if customAvatar:
-        avatar_name, tagline, avatar_path = get_custom_avatar(avatar_type, personal_interest)
-    else:
-        avatar_name, tagline, avatar_path = get_random_avatar(avatar_type, personal_interest)
+        return get_custom_avatar(avatar_type, personal_interest)
+    return get_random_avatar(avatar_type, personal_interest, None if chatID is None else qr_payload(chatID))
+
+
+def compose_event_pass(pillar, chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None, canvas=None, pooled=False, avatar=None):
+    # Draws the pass and returns the Image without encoding it, None if an asset is missing
+    # canvas: optional pass image from an earlier render of the same pillar to draw on again,
+    # only its dirty regions get reset instead of copying the whole template (any other image is ignored)
+    # pooled: take the canvas from canvas_pool, hand the pass back with release_canvas once done with it
+    # (a pass that fails after that is handed back here)
+    # avatar: (avatar name, tagline, avatar path) already picked with pick_avatar,
+    # a custom avatar received over the websocket has its PNG bytes in place of the path
+    template_path = get_pillar_template(pillar)
+    avatar_name, tagline, avatar_path = avatar or pick_avatar(customAvatar, avatar_type, personal_interest, chatID)
+
+    # Load fonts, parsed once per process and resolved next to this script
+    try:
+        name_font, avatar_font, catchphrase_font = get_pass_fonts()
+    except IOError as e:
+        print(f"Error loading fonts: {e}")
+        return None
 
     # Load the template and avatar
     try:
-        template = Image.open(template_path)
-        avatar = Image.open(avatar_path)
+        # Decoded once per process and shared as the static base layer of the pillar
+        base = get_base_layer(template_path)
+        pass_width, pass_height = base.size
+        regions = dirty_regions(pass_width, name_font, avatar_font, catchphrase_font)
+        if customAvatar:
+            layers = attendee_layers(chatID, name, avatar_name, tagline, load_avatar_layer(avatar_path, True), pass_width, True)
+        else:
+            # Random avatars only add the name and QR code to a cached pre-composited shell
+            layers = shell_layers(base, regions, avatar_path, avatar_name, tagline) + personal_layers(chatID, name, pass_width)
     except IOError as e:
         print(f"Error loading images: {e}")
         return None
-    
+
     # Create new pass
-    pass_width, pass_height = template.size
-    event_pass = Image.new('RGB', (pass_width, pass_height), 'white')
-    event_pass.paste(template, (0, 0))
-
-    # Resize avatar
-    avatar_resized = avatar.resize((420, 420))
-    
-    # Create circular mask
-    mask = Image.new('L', avatar_resized.size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, mask.size[0], mask.size[1]), fill=255)
-    
-    # Apply mask to avatar
-    output = Image.new('RGBA', avatar_resized.size, (0, 0, 0, 0))
-    output.paste(avatar_resized, (0, 0))
-    output.putalpha(mask)
-
-    # Paste onto event pass
-    event_pass.paste(output, (330, 666), output)
-
-    # Add text elements
-    draw = ImageDraw.Draw(event_pass)
-
-    # Load a font
+    if canvas is not None and canvas_matches(canvas, base):
+        event_pass = reset_dirty_regions(canvas, base, regions)
+    elif pooled:
+        event_pass = acquire_canvas(base, regions)
+    else:
+        event_pass = base.copy()
+    mark_canvas(event_pass, base)
+
+    # Every layer is blended straight into the pass, one write per dirty pixel
     try:
-        name_font = ImageFont.truetype("Garet-Heavy.ttf", 45)
-        avatar_font = ImageFont.truetype("Garet-Heavy.ttf", 35)
-        catchphrase_font = ImageFont.truetype("Garet-Book.ttf", 42)
-    except IOError:
-        print("Font file not found. Using default font.")
-        font = ImageFont.load_default(50)
-        print('font',font)
-    
-    # Function to draw centered text
-    def draw_right_centered_text(draw, text, font, y, image_width):
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        x = ((image_width - text_width) / 2 ) #+ 240
-        text_position = (x, y)
-
-        # Draw the text
-        draw.text(text_position, text, fill="black", font=font)
+        return composite(event_pass, layers)
+    except BaseException:
+        discard_pass(event_pass, pooled)
+        raise
+
+
+def discard_pass(event_pass, pooled):
+    # A pooled pass that never reaches the caller goes straight back to canvas_pool,
+    # otherwise each failed pass would leave a canvas allocated for good
+    if pooled and event_pass is not None:
+        release_canvas(event_pass)
+
 
+def load_avatar_layer(avatar_path, customAvatar=False):
+    # The avatar cut to a circle at AVATAR_SIZE, as an RGBA image
+    if customAvatar:
+        # bytes: a custom avatar kept in memory (websocket_comfyUI.WEBSOCKET_OUTPUT)
+        with Image.open(BytesIO(avatar_path) if isinstance(avatar_path, bytes) else avatar_path) as avatar:
+            return make_circular_avatar(avatar, AVATAR_SIZE)
+    # Sample avatars are resized and masked once, then reused from memory or disk
+    return load_circular_avatar(avatar_path, AVATAR_SIZE)
+
+
+def personal_layers(chatID, name, pass_width):
+    # The attendee's name and QR code, the only layers that differ between random-avatar passes
     if (name==None):
         name = "Alex Tan"
 
-    # Add centered text to event pass
-    draw_right_centered_text(draw, name, name_font, 1132, pass_width)
-    draw_right_centered_text(draw, avatar_name, avatar_font, 1299, pass_width)
-    draw_right_centered_text(draw, f'"{tagline}"', catchphrase_font, 1369, pass_width)
+    name_font_file, name_size = PASS_FONTS[0]
+    return [
+        # Text lines are shrunk to fit the pills, each one a cached glyph mask
+        fitted_text_layer(name, name_font_file, name_size, NAME_Y, TEXT_MAX_WIDTH, pass_width),
+        # Dark QR modules only, the base layer already has the QR box white
+        qr_layer(qr_payload(chatID), qr_position(pass_width)),
+    ]
+
+
+def avatar_text_layers(avatar_name, tagline, pass_width, pinned=False):
+    # Random avatar names and taglines come from a fixed list, so their masks can be kept for good
+    (avatar_font_file, avatar_size), (catchphrase_font_file, catchphrase_size) = PASS_FONTS[1:]
+    return [
+        fitted_text_layer(avatar_name, avatar_font_file, avatar_size, AVATAR_NAME_Y, TEXT_MAX_WIDTH, pass_width,
+                          pinned=pinned),
+        fitted_text_layer(f'"{tagline}"', catchphrase_font_file, catchphrase_size, TAGLINE_Y, TEXT_MAX_WIDTH, pass_width,
+                          pinned=pinned),
+    ]
 
 
-    # Generate QR code
-    qr_data = "SUTD_OH2025_" + chatID
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
+def attendee_layers(chatID, name, avatar_name, tagline, avatar_layer, pass_width, customAvatar=False):
+    # Compositor layers of everything on a pass that depends on the attendee rather than the pillar
+    return ([image_layer(avatar_layer, AVATAR_POSITION)]  # circular avatar blended through its own alpha
+            + avatar_text_layers(avatar_name, tagline, pass_width, pinned=not customAvatar)
+            + personal_layers(chatID, name, pass_width))
 
-    qr_img = qr.make_image(fill='black', back_color='white')
 
-    # Resize QR code
-    qr_img_resized = qr_img.resize((400, 400))
+def shell_layers(base, regions, avatar_path, avatar_name, tagline):
+    """Random-avatar pass content shared between attendees, as tiles from shell_cache.
 
-    # Calculate position to center the QR code
-    qr_x = (pass_width - qr_img_resized.width) // 2  # Adjust the x position as needed
-    qr_y = 1517 #(pass_height - qr_img_resized.height) // 2  # Adjust the y position as needed
+    The tiles cover the avatar, avatar name and tagline regions with those already composited on.
+    """
+    avatar_box, _, avatar_name_box, tagline_box, _ = regions
+    tiles = get_shell_tiles(base, ("avatar", avatar_path), [avatar_box],
+                            lambda: [image_layer(load_avatar_layer(avatar_path), AVATAR_POSITION)])
+    tiles = tiles + get_shell_tiles(base, ("text", avatar_name, tagline), [avatar_name_box, tagline_box],
+                                    lambda: avatar_text_layers(avatar_name, tagline, base.width, pinned=True))
+    return [tile_layer(tile, position) for tile, position in tiles]
 
-    # Paste QR code onto event pass
-    event_pass.paste(qr_img_resized, (qr_x, qr_y))
-    script_dir = os.path.dirname(__file__)
-    output_path = os.path.join(script_dir, f"FinalPass\\{chatID}_event_pass.png")
+
+def warm_pass_shells(pillars=PILLARS):
+    # Optional eager warm-up of every shell, otherwise they are built on first use
+    sample_paths = sorted(glob.glob(os.path.join(glob.escape(asset_dir("Samples")), "*.png")))
+    fonts = get_pass_fonts()
+    for pillar in pillars:
+        base = get_base_layer(get_pillar_template(pillar))
+        regions = dirty_regions(base.width, *fonts)
+        for avatar_path in sample_paths:
+            for avatar_name, tagline in zip(AVATAR_NAMES, TAGLINES):
+                shell_layers(base, regions, avatar_path, avatar_name, tagline)
+
+
+def pass_static_layout(pillar):
+    # (base layer, dirty regions) behind every pass of the pillar, spliced encoders reuse the rows in between
+    base = get_base_layer(get_pillar_template(pillar))
+    return base, dirty_regions(base.width, *get_pass_fonts())
+
+
+def event_pass_filename(chatID, encoder="png", size_name=None):
+    # The full-size pass keeps the plain name, scaled down sizes get theirs appended
+    suffix = f"_{size_name}" if size_name else ""
+    return f"{chatID}_event_pass{suffix}{encoder_extension(encoder)}"
+
+
+def encode_event_pass_sizes(pillar, chatID, event_pass, sizes, encoder="png"):
+    """Encode the pass at every size in {name: reduction factor} from the one in-memory canvas.
+
+    Returns {size name: (file name, memoryview of the encoded file)}.
+    """
+    encoded = encode_pyramid(build_pyramid(event_pass, sizes), encoder, pass_static_layout(pillar))
+    return {size_name: (event_pass_filename(chatID, encoder, size_name if sizes[size_name] != 1 else None), data)
+            for size_name, data in encoded.items()}
+
+
+def pass_render_key(pillar, chatID, name, avatar, encoder="png"):
+    # render_cache key of the pass, None when a source file cannot be read (rendering then reports it)
+    avatar_name, tagline, avatar_path = avatar
+    try:
+        return render_key(BASE_LAYER_VERSION, file_digest(get_pillar_template(pillar)), file_digest(avatar_path),
+                          "Alex Tan" if name is None else name, avatar_name, tagline, qr_payload(chatID),
+                          encoder, sorted(get_encoder_options(encoder).items()))
+    except OSError:
+        return None
+
+
+def encode_event_pass(pillar, chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None, canvas=None, encoder="png", pooled=False, cache=True):
+    """Render and encode one pass, or take it from the render cache when an identical pass was made before.
+
+    Returns (memoryview of the encoded file, event_pass), or None on failure. On a cache hit nothing is
+    drawn and event_pass is the cached file, opened lazily.
+    """
+    avatar = pick_avatar(customAvatar, avatar_type, personal_interest, chatID)
+    key = pass_render_key(pillar, chatID, name, avatar, encoder) if cache else None
+    cached_path = cached_render(key) if key else None
+    if cached_path is not None:
+        try:
+            with open(cached_path, 'rb') as f:
+                data = f.read()
+            return memoryview(data), Image.open(BytesIO(data))
+        except IOError:
+            forget_render(key)
+
+    event_pass = compose_event_pass(pillar, chatID, name, customAvatar, avatar_type, personal_interest, canvas, pooled, avatar)
+    if event_pass is None:
+        return None
+    buffer = BytesIO()
+    try:
+        # PNGs carry their cache key, so the cache index can be rebuilt from the files
+        encode_pass(event_pass, buffer, encoder, pass_static_layout(pillar), {HASH_TEXT_KEY: key} if key else None)
+    except BaseException:
+        discard_pass(event_pass, pooled)
+        raise
+    # getbuffer() exposes the encoded bytes without copying them out of the BytesIO
+    data = buffer.getbuffer()
+    if key:
+        try:
+            store_render(key, data, encoder_extension(encoder))
+        except IOError as e:
+            print(f"Error caching event pass: {e}")
+    return data, event_pass
+
+
+def create_event_pass(pillar, chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None, canvas=None, encoder="png", pooled=False, sizes=None, cache=True):
+    # Renders the pass into FinalPass/ and returns (output_path, event_pass)
+    # encoder: one of encoders.ENCODERS, picks the output format and compression settings
+    # sizes: optional {name: reduction factor} (see pyramid.OUTPUT_SIZES) to also save scaled down copies,
+    # output_path is then the largest one
+    # cache: reuse an identical earlier pass from render_cache (single size only)
+    if sizes:
+        event_pass = compose_event_pass(pillar, chatID, name, customAvatar, avatar_type, personal_interest, canvas, pooled)
+    else:
+        result = encode_event_pass(pillar, chatID, name, customAvatar, avatar_type, personal_interest, canvas, encoder, pooled, cache)
+        event_pass = result and result[1]
+    if event_pass is None:
+        return None
+    output_path = os.path.join(asset_dir("FinalPass"), event_pass_filename(chatID, encoder))
 
     try:
-        event_pass.save(output_path)
+        if sizes:
+            encoded = encode_event_pass_sizes(pillar, chatID, event_pass, sizes, encoder)
+            for filename, data in encoded.values():
+                with open(os.path.join(asset_dir("FinalPass"), filename), 'wb') as f:
+                    f.write(data)
+            output_path = os.path.join(asset_dir("FinalPass"), encoded[min(sizes, key=sizes.get)][0])
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(result[0])
         print(f"Event pass saved to {output_path}")
     except IOError as e:
         print(f"Error saving event pass: {e}")
+        discard_pass(event_pass, pooled)
         return None
+    except BaseException:
+        discard_pass(event_pass, pooled)
+        raise
 
     return output_path, event_pass
-    
-
-pillar = input("Enter pillar: ")
-chatID = input("Enter chatid: ")
-output_path, event_pass = create_event_pass(pillar, chatID, name="Alex Tan", customAvatar = True, avatar_type="Panda", personal_interest="computer scientist")
-print(output_path)
-if event_pass:
-    event_pass.show()
-else:
-    print("Failed to create event pass.")
\ No newline at end of file
+
+
+def render_event_pass(pillar, chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None, canvas=None, encoder="png", sink=None, pooled=False, cache=True):
+    """Render and encode the pass in memory, for callers that send it straight to a chat.
+
+    Returns (memoryview of the encoded file, event_pass), or None on failure.
+    sink: optional folder (e.g. asset_dir("FinalPass")) that also gets a copy of the encoded file.
+    cache: reuse an identical earlier pass from render_cache, e.g. when an attendee asks for a resend.
+    """
+    result = encode_event_pass(pillar, chatID, name, customAvatar, avatar_type, personal_interest, canvas, encoder, pooled, cache)
+    if result is None:
+        return None
+    data, event_pass = result
+
+    if sink is not None:
+        output_path = os.path.join(sink, event_pass_filename(chatID, encoder))
+        try:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+        except IOError as e:
+            print(f"Error saving event pass: {e}")
+
+    return data, event_pass
+
+
+def render_event_pass_sizes(pillar, chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None, canvas=None, encoder="png", sizes=None, sink=None, pooled=False):
+    """render_event_pass for several output sizes at once, e.g. chat preview, kiosk and print.
+
+    Returns ({size name: memoryview of the encoded file}, event_pass), or None on failure.
+    sizes: {name: reduction factor}, pyramid.OUTPUT_SIZES by default.
+    """
+    event_pass = compose_event_pass(pillar, chatID, name, customAvatar, avatar_type, personal_interest, canvas, pooled)
+    if event_pass is None:
+        return None
+    try:
+        encoded = encode_event_pass_sizes(pillar, chatID, event_pass, sizes or OUTPUT_SIZES, encoder)
+    except BaseException:
+        discard_pass(event_pass, pooled)
+        raise
+
+    if sink is not None:
+        for filename, data in encoded.values():
+            try:
+                with open(os.path.join(sink, filename), 'wb') as f:
+                    f.write(data)
+            except IOError as e:
+                print(f"Error saving event pass: {e}")
+
+    return {size_name: data for size_name, (_, data) in encoded.items()}, event_pass
+
+
+def render_all_pillars(chatID, name=None, customAvatar = False, avatar_type="Male", personal_interest=None, pillars=PILLARS, encoder="png", sink=None):
+    """The attendee's pass in every pillar, for organisers to choose from.
+
+    The avatar, text lines and QR code are made once and composited onto each pillar's base layer,
+    the pillars are then drawn and encoded in parallel threads.
+    Returns {pillar: (memoryview of the encoded file, event_pass)}, or None on failure.
+    sink: optional folder that also gets a <chatID>_<pillar>_event_pass file per pillar.
+    """
+    avatar_name, tagline, avatar_path = pick_avatar(customAvatar, avatar_type, personal_interest, chatID)
+    try:
+        fonts = get_pass_fonts()
+    except IOError as e:
+        print(f"Error loading fonts: {e}")
+        return None
+    try:
+        bases = {pillar: get_base_layer(get_pillar_template(pillar)) for pillar in pillars}
+        avatar_layer = load_avatar_layer(avatar_path, customAvatar)
+    except IOError as e:
+        print(f"Error loading images: {e}")
+        return None
+
+    # Every template is 1080 wide, so this is normally one set of layers shared by all pillars
+    layers = {}
+    for base in bases.values():
+        if base.width not in layers:
+            layers[base.width] = attendee_layers(chatID, name, avatar_name, tagline, avatar_layer, base.width, customAvatar)
+
+    def render(pillar):
+        base = bases[pillar]
+        event_pass = composite(base.copy(), layers[base.width])
+        buffer = BytesIO()
+        encode_pass(event_pass, buffer, encoder, (base, dirty_regions(base.width, *fonts)))
+        return buffer.getbuffer(), event_pass
+
+    # Pillow releases the GIL while copying, pasting and compressing, so the pillars overlap
+    with ThreadPoolExecutor(max_workers=len(pillars) or 1) as executor:
+        rendered = dict(zip(pillars, executor.map(render, pillars)))
+
+    if sink is not None:
+        for pillar, (data, _) in rendered.items():
+            try:
+                with open(os.path.join(sink, event_pass_filename(f"{chatID}_{pillar}", encoder)), 'wb') as f:
+                    f.write(data)
+            except IOError as e:
+                print(f"Error saving event pass: {e}")
+
+    return rendered
+
+
+def preload_renderer(warm_shells=False):
+    # Decode templates, fonts and sample avatars up front so the first pass is as fast as the rest
+    # warm_shells: also pre-composite every random-avatar pass shell
+    for pillar in PILLARS:
+        get_base_layer(get_pillar_template(pillar))
+    preload_fonts()
+    preload_sample_avatars()
+    if warm_shells:
+        warm_pass_shells()
+    enable_block_reuse()
+
+
+def _render_record(record, encoder="png", sizes=None, cache=False):
+    # Worker side of render_passes, only the output path travels back to the parent
+    result = None
+    try:
+        kwargs = dict(record, chatID=str(record["chatID"]))
+        # Workers draw every pass on a pooled canvas, so memory stays flat over long batches
+        # (create_event_pass hands the canvas back itself when the pass fails)
+        result = create_event_pass(**kwargs, encoder=encoder, pooled=True, sizes=sizes, cache=cache)
+    except Exception as e:
+        print(f"Error rendering {record}: {e}")
+    finally:
+        if result:
+            release_canvas(result[1])
+    return record, result[0] if result else None
+
+
+def render_passes(records, processes=None, max_pending=None, encoder="png", sizes=None, cache=False, warm_shells=False):
+    """Render many passes in a pool of pre-warmed worker processes.
+
+    records is an iterable of dicts with create_event_pass keyword arguments
+    (pillar, chatID and optionally name, customAvatar, avatar_type, personal_interest).
+    Yields (record, output_path) as soon as each pass finishes, output_path is None on failure.
+    At most max_pending records are read ahead, so records can be a lazy generator of any length.
+    encoder, sizes and cache are passed on to create_event_pass for every record. The render cache is off
+    by default, as a new attendee list never hits it and each pass would only be written twice.
+    warm_shells pre-composites every random-avatar shell before the first record.
+    """
+    processes = processes or os.cpu_count()
+    max_pending = max_pending or 4 * processes
+
+    # Warm the parent first, forked workers then inherit the decoded assets
+    preload_renderer(warm_shells)
+    finished = queue.Queue()
+    pending = 0
+    with multiprocessing.Pool(processes, initializer=preload_renderer, initargs=(warm_shells,)) as pool:
+        for record in records:
+            pool.apply_async(_render_record, (record, encoder, sizes, cache), callback=finished.put)
+            pending += 1
+            if pending >= max_pending:
+                yield finished.get()
+                pending -= 1
+        while pending:
+            yield finished.get()
+            pending -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate SUTD Open House event passes")
+    parser.add_argument("records", nargs="?", help="JSON file with a list of pass records to render in parallel")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--encoder", choices=ENCODERS, default="png", help="output format and compression settings")
+    parser.add_argument("--sizes", type=parse_sizes, default=None,
+                        help="also save scaled down copies, e.g. print=1,kiosk=2,preview=4 (name=reduction factor)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse and store passes in the render cache, for re-running a list (off: every pass is new)")
+    parser.add_argument("--warm-shells", action="store_true", help="pre-composite every random-avatar pass shell up front")
+    args = parser.parse_args()
+
+    if args.records is None:
+        pillar = input("Enter pillar: ")
+        chatID = input("Enter chatid: ")
+        result = create_event_pass(pillar, chatID, name="Alex Tan", customAvatar = True, avatar_type="Panda", personal_interest="computer scientist")
+        if result:
+            output_path, event_pass = result
+            print(output_path)
+            event_pass.show()
+        else:
+            print("Failed to create event pass.")
+        return
+
+    with open(args.records, encoding='utf-8') as f:
+        records = json.load(f)
+
+    start = time.perf_counter()
+    rendered = failed = 0
+    for record, output_path in render_passes(records, args.processes, encoder=args.encoder, sizes=args.sizes, cache=args.cache,
+                                             warm_shells=args.warm_shells):
+        if output_path:
+            rendered += 1
+        else:
+            failed += 1
+            print(f"Failed to create event pass for {record.get('chatID')}")
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {rendered} passes ({failed} failed) in {elapsed:.1f}s, {rendered / elapsed:.1f} passes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+from functools import lru_cache
+
+from PIL import Image, ImageDraw
+
+# Masks are drawn this many times larger and box-filtered down, giving anti-aliased edges
+SUPERSAMPLE = 4
+
+
+def _draw_circle(draw, box):
+    draw.ellipse(box, fill=255)
+
+
+def _draw_rounded(draw, box):
+    draw.rounded_rectangle(box, radius=min(box[2], box[3]) // 8, fill=255)
+
+
+SHAPES = {
+    "circle": _draw_circle,
+    "rounded": _draw_rounded,
+}
+
+
+@lru_cache(maxsize=32)
+def get_mask(size, shape="circle"):
+    """Anti-aliased 'L' mask for the shape, built once per (size, shape) - shared, do not draw on it."""
+    width, height = size
+    mask = Image.new('L', (width * SUPERSAMPLE, height * SUPERSAMPLE), 0)
+    SHAPES[shape](ImageDraw.Draw(mask), (0, 0, mask.width - 1, mask.height - 1))
+    # reduce() averages each SUPERSAMPLE x SUPERSAMPLE block in C, the edge pixels get partial coverage
+    return mask.reduce(SUPERSAMPLE)
@@ -0,0 +1,127 @@
+#PNG writer that only compresses the rows of a pass that differ from its pillar's base layer.
+#Rows outside every dirty region are the same in every pass of a pillar, so they are deflated once
+#per base layer and ended at a full-flush boundary. Each pass then deflates its dirty rows the same way
+#and the pieces are spliced into one zlib stream and a single IDAT chunk.
+
+import struct
+import threading
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# zlib header for a 32K window, the level bits are only a hint to decoders
+ZLIB_HEADER = b"\x78\x9c"
+ADLER_BASE = 65521
+
+_static = {}  # (id(base), bands, compress_level) -> (base, [(compressed band, adler32, length)])
+_lock = threading.Lock()
+
+
+def static_bands(height, regions):
+    # Row ranges [top, bottom) that no dirty region touches
+    bands = []
+    top = 0
+    for _, region_top, _, region_bottom in sorted(regions, key=lambda box: box[1]):
+        region_top, region_bottom = max(region_top, 0), min(region_bottom, height)
+        if region_top > top:
+            bands.append((top, region_top))
+        top = max(top, region_bottom)
+    if top < height:
+        bands.append((top, height))
+    return tuple(bands)
+
+
+def adler32_combine(adler1, adler2, length2):
+    # Adler-32 of two concatenated byte strings from the checksums of each, as zlib's adler32_combine
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = remainder * sum1 % ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xffff) + ADLER_BASE - 1) % ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - remainder) % ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def filter_rows(band):
+    """PNG-filtered rows of an RGB image whose first row does not depend on the row above it.
+
+    Pillow picks the filter of each row adaptively and treats the row above the first one as zeros,
+    where Up is the same as None and Paeth the same as Sub. An Average first row is replaced by None.
+    """
+    # Uncompressed zlib stream straight from Pillow's PNG encoder, inflating stored blocks is a copy
+    filtered = bytearray(zlib.decompress(band.tobytes("zip", "RGB", 0, 0)))
+    first_filter = filtered[0]
+    if first_filter == 2:
+        filtered[0] = 0
+    elif first_filter == 4:
+        filtered[0] = 1
+    elif first_filter == 3:
+        filtered[:band.width * 3 + 1] = b"\x00" + band.crop((0, 0, band.width, 1)).tobytes()
+    return filtered
+
+
+def deflate_rows(image, top, bottom, compress_level):
+    """Filter rows [top, bottom) of an RGB image and deflate them as a standalone piece.
+
+    Returns (raw deflate data ending on a full flush, adler32 of the filtered rows, their length).
+    """
+    filtered = filter_rows(image.crop((0, top, image.width, bottom)))
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    deflated = compressor.compress(filtered) + compressor.flush(zlib.Z_FULL_FLUSH)
+    return deflated, zlib.adler32(filtered), len(filtered)
+
+
+def get_static_pieces(base, bands, compress_level):
+    key = (id(base), bands, compress_level)
+    with _lock:
+        entry = _static.get(key)
+    if entry is None or entry[0] is not base:
+        entry = (base, [deflate_rows(base, top, bottom, compress_level) for top, bottom in bands])
+        with _lock:
+            _static[key] = entry
+    return entry[1]
+
+
+def png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)))
+
+
+def save_spliced_png(event_pass, fp, base, regions, compress_level=6, text=None):
+    """Save an RGB pass drawn on base as PNG, compressing only the rows inside regions.
+
+    Pixels outside the regions must be unchanged from base. fp is a path or a binary file object.
+    text: optional {keyword: value} written as tEXt chunks ahead of the image data.
+    """
+    width, height = event_pass.size
+    bands = static_bands(height, regions)
+    static_pieces = dict(zip(bands, get_static_pieces(base, bands, compress_level)))
+
+    # Alternate static and dirty row ranges from top to bottom
+    pieces = []
+    top = 0
+    for band in bands + ((height, height),):
+        if band[0] > top:
+            pieces.append(deflate_rows(event_pass, top, band[0], compress_level))
+        if band in static_pieces:
+            pieces.append(static_pieces[band])
+        top = band[1]
+
+    adler = 1
+    for _, piece_adler, length in pieces:
+        adler = adler32_combine(adler, piece_adler, length)
+    # A final empty block closes the deflate stream after the last full flush
+    final_block = zlib.compressobj(compress_level, zlib.DEFLATED, -15).flush()
+    idat = b"".join([ZLIB_HEADER] + [deflated for deflated, _, _ in pieces] + [final_block, struct.pack(">I", adler)])
+
+    png = b"".join([
+        PNG_SIGNATURE,
+        # 8-bit RGB, deflate, adaptive filtering method, no interlace
+        png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        *[png_chunk(b"tEXt", keyword.encode('latin-1') + b"\0" + value.encode('latin-1'))
+          for keyword, value in (text or {}).items()],
+        png_chunk(b"IDAT", idat),
+        png_chunk(b"IEND", b""),
+    ])
+    if hasattr(fp, "write"):
+        fp.write(png)
+    else:
+        with open(fp, 'wb') as f:
+            f.write(png)
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from encoders import encode_pass
+
+# Output size name -> reduction factor from the full 1080x1920 pass
+OUTPUT_SIZES = {"print": 1, "kiosk": 2, "preview": 4}
+
+
+def parse_sizes(spec):
+    """Parse a command line size list such as "print=1,preview=4" into {name: factor}."""
+    sizes = {}
+    for item in spec.split(','):
+        name, _, factor = item.partition('=')
+        if not name.strip() or not factor.strip().isdigit() or int(factor) < 1:
+            raise ValueError(f"Bad output size {item!r}, expected name=factor with a whole factor of 1 or more")
+        sizes[name.strip()] = int(factor)
+    return sizes
+
+
+def build_pyramid(event_pass, sizes=OUTPUT_SIZES):
+    """Scale the pass down to every size in {name: factor}, returns {name: image}.
+
+    Each level is reduced from the largest level already built whose factor divides its own
+    (1 -> 2 -> 4 rather than 1 -> 4), so full-size pixels are only averaged once.
+    The factor 1 image is the pass itself, not a copy.
+    """
+    levels = {1: event_pass}
+    for factor in sorted(set(sizes.values())):
+        if factor not in levels:
+            source = max(level for level in levels if factor % level == 0)
+            levels[factor] = levels[source].reduce(factor // source)
+    return {name: levels[factor] for name, factor in sizes.items()}
+
+
+def encode_pyramid(images, encoder="png", static=None):
+    """Encode every {name: image} at once, returns {name: memoryview of the encoded file}.
+
+    Pillow and zlib release the GIL while compressing, so the sizes encode in parallel threads.
+    static is passed on to encode_pass and only used for the full-size image.
+    """
+    def encode(image):
+        buffer = BytesIO()
+        encode_pass(image, buffer, encoder, static)
+        return buffer.getbuffer()
+
+    with ThreadPoolExecutor(max_workers=len(images) or 1) as executor:
+        return dict(zip(images, executor.map(encode, images.values())))
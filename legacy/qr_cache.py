@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+from PIL import Image
+import qrcode
+from qrcode.exceptions import DataOverflowError
+
+from base_layer import QR_SIZE
+from compositor import composite, fill_layer
+
+# Version 2 with low error correction holds SUTD_OH2025_ plus any chat id up to 20 characters,
+# pinning it skips qrcode's version search and keeps every pass on the same module grid
+QR_VERSION = 2
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_L
+QR_BORDER = 4
+# Pinned instead of letting qrcode score all 8 patterns (about 85% of the matrix cost), which every
+# first print of a new chat id paid. Any of 0-7 is a valid code, 4 has the lowest average penalty
+# score for SUTD_OH2025_ payloads. None brings the scoring back
+QR_MASK_PATTERN = 4
+
+
+def qr_payload(chatID):
+    return "SUTD_OH2025_" + str(chatID)
+
+
+@lru_cache(maxsize=4096)
+def qr_matrix(payload):
+    """Return (modules per side, one byte per module: 255 dark / 0 light), border included."""
+    qr = qrcode.QRCode(version=QR_VERSION, error_correction=QR_ERROR_CORRECTION, border=QR_BORDER,
+                       mask_pattern=QR_MASK_PATTERN)
+    qr.add_data(payload)
+    try:
+        qr.make(fit=False)
+    except DataOverflowError:
+        # Unusually long payload, let qrcode pick the smallest version that fits
+        qr = qrcode.QRCode(error_correction=QR_ERROR_CORRECTION, border=QR_BORDER, mask_pattern=QR_MASK_PATTERN)
+        qr.add_data(payload)
+        qr.make(fit=True)
+    modules = qr.get_matrix()
+    return len(modules), bytes(255 if module else 0 for row in modules for module in row)
+
+
+def qr_mask(payload, size=QR_SIZE):
+    # Dark modules scaled by a whole number of pixels per module so edges stay sharp
+    modules, matrix = qr_matrix(payload)
+    scale = max(min(size) // modules, 1)
+    return Image.frombytes('L', (modules, modules), matrix).resize(
+        (modules * scale, modules * scale), Image.Resampling.NEAREST)
+
+
+def qr_layer(payload, position, size=QR_SIZE):
+    """Compositor layer with the dark modules centered in the size box at position.
+
+    Only dark modules are drawn, the box must already be white (the pass base layer is).
+    """
+    x, y = position
+    mask = qr_mask(payload, size)
+    return fill_layer('black', (x + (size[0] - mask.width) // 2, y + (size[1] - mask.height) // 2), mask)
+
+
+def paste_qr(canvas, payload, position, size=QR_SIZE):
+    # Draw the QR code straight onto any canvas, clearing its box to white first
+    x, y = position
+    canvas.paste('white', (x, y, x + size[0], y + size[1]))
+    composite(canvas, [qr_layer(payload, position, size)])
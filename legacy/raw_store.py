@@ -0,0 +1,84 @@
+#Uncompressed, memory-mapped copies of the pillar base layers.
+#Build once after changing a template (workers fall back to decoding the PNG when a file is missing or stale,
+#running workers only look for a newly built file again once the template changes or they restart):
+#   python raw_store.py
+
+import mmap
+import os
+import struct
+import threading
+
+from PIL import Image
+
+# magic, format version, width, height, reserved, source template mtime_ns
+HEADER = struct.Struct("<8sIIIIQ")
+MAGIC = b"PASSRAW1"
+
+_mapped = {}  # raw_path -> ((version, source mtime), image backed by the mapping, or None if unusable)
+_lock = threading.Lock()
+
+
+def raw_path_for(template_path):
+    template_dir, template_name = os.path.split(template_path)
+    return os.path.join(template_dir, ".raw", os.path.splitext(template_name)[0] + ".raw")
+
+
+def write_raw(image, raw_path, source_mtime, version):
+    """Store an RGB image as a header plus its pixels in Pillow's own 4-bytes-per-pixel layout."""
+    os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+    tmp_path = f"{raw_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, version, image.width, image.height, 0, source_mtime))
+        f.write(image.convert('RGB').tobytes('raw', 'RGBX'))
+    os.replace(tmp_path, raw_path)
+
+
+def map_raw(raw_path, source_mtime, version):
+    """Return a read-only RGB image backed directly by the mapped file, or None if missing, stale or corrupt.
+
+    Every process mapping the same file shares one page-cache copy, nothing is decoded or copied.
+    A None is remembered until the template changes, so a missing file is not reopened on every pass.
+    """
+    with _lock:
+        entry = _mapped.get(raw_path)
+    if entry is not None and entry[0] == (version, source_mtime):
+        return entry[1]
+
+    image = _open_mapped(raw_path, source_mtime, version)
+    with _lock:
+        _mapped[raw_path] = ((version, source_mtime), image)
+    return image
+
+
+def _open_mapped(raw_path, source_mtime, version):
+    try:
+        with open(raw_path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    # A truncated or corrupt file is only a slower render from the PNG, never an error
+    usable = len(mapping) >= HEADER.size
+    if usable:
+        magic, file_version, width, height, _, file_mtime = HEADER.unpack_from(mapping)
+        usable = magic == MAGIC and (file_version, file_mtime) == (version, source_mtime) \
+            and len(mapping) == HEADER.size + width * height * 4
+    if not usable:
+        mapping.close()
+        return None
+
+    # Image.frombuffer would report the RGBX raw mode, mapping it as RGB keeps it pasteable into passes.
+    # The image holds a reference to the mapping, which stays open for as long as the image lives
+    image = Image.new('RGB', (0, 0))._new(Image.core.map_buffer(mapping, (width, height), 'raw', HEADER.size, ('RGB', 0, 1)))
+    image.readonly = 1
+    return image
+
+
+def main():
+    from base_layer import build_raw_base_layers
+
+    for raw_path in build_raw_base_layers():
+        print(f"Wrote {raw_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#Content-addressed cache of encoded passes, so "resend my pass" skips rendering an identical pass.
+#Files are stored as FinalPass/.render_cache/<hash><extension>; PNGs also carry the hash in a
+#"render_hash" text chunk, which is checked when the index is rebuilt from disk in a new process.
+
+from collections import OrderedDict
+import glob
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+from assets import asset_dir
+
+# Bump when the pass drawing changes (layout, fonts, QR settings) so older renders stop matching
+RENDER_CACHE_VERSION = 2
+# Total size of cached files, least recently used ones are deleted first
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HASH_TEXT_KEY = "render_hash"
+# Stores between rescans of the folder for files other worker processes stored or evicted; the folder
+# is also rescanned whenever this process counts it past MAX_CACHE_BYTES. Other workers' files may
+# push it over by about (workers - 1) x RESCAN_EVERY passes in between
+RESCAN_EVERY = 32
+
+_index = None  # hash -> (path, size), least recently used first
+_cache_bytes = 0
+_stores_since_scan = 0
+_digests = {}  # path -> (mtime_ns, sha256 of the file)
+_lock = threading.Lock()
+
+
+def cache_dir():
+    return os.path.join(asset_dir("FinalPass"), ".render_cache")
+
+
+def file_digest(path):
+    # sha256 of a file's bytes, recomputed only when the file changes
+    if isinstance(path, bytes):
+        return hashlib.sha256(path).hexdigest()  # already in memory, e.g. an avatar from the websocket
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        entry = _digests.get(path)
+    if entry is None or entry[0] != mtime:
+        with open(path, 'rb') as f:
+            entry = (mtime, hashlib.sha256(f.read()).hexdigest())
+        with _lock:
+            _digests[path] = entry
+    return entry[1]
+
+
+def render_key(*parts):
+    """Hash of everything that decides the pass pixels and encoding, e.g. template digest, avatar digest,
+    name, avatar name, tagline, QR payload and encoder settings."""
+    digest = hashlib.sha256(str(RENDER_CACHE_VERSION).encode())
+    for part in parts:
+        digest.update(b"\0" + str(part).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _embedded_hash(path):
+    # Image.open only reads the chunks before the pixel data, where the text chunk is written
+    try:
+        with Image.open(path) as image:
+            return image.info.get(HASH_TEXT_KEY)
+    except (OSError, SyntaxError):
+        return None
+
+
+def _load_index(known=None):
+    # Rebuilt from the cache folder, oldest file first. Caller holds _lock
+    # known: the current index, whose files were checked already - this is then a rescan that picks up
+    # what other processes stored and evicted in the shared folder
+    global _index, _cache_bytes
+    entries = []
+    for path in glob.glob(os.path.join(glob.escape(cache_dir()), "*")):
+        key, extension = os.path.splitext(os.path.basename(path))
+        if extension == ".tmp":
+            continue
+        if extension == ".png" and (known is None or key not in known) and _embedded_hash(path) != key:
+            if known is None:
+                print(f"Ignoring render cache file without a matching hash: {path}")
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, key, path, stat.st_size))
+    _index = OrderedDict((key, (path, size)) for _, key, path, size in sorted(entries))
+    _cache_bytes = sum(size for _, size in _index.values())
+
+
+def cached_render(key):
+    """Path of the cached file for key, or None."""
+    with _lock:
+        if _index is None:
+            _load_index()
+        entry = _index.get(key)
+        if entry is not None:
+            _index.move_to_end(key)
+    if entry is None:
+        return None
+    try:
+        # Touching the file keeps the LRU order when the index is rebuilt from mtimes
+        os.utime(entry[0])
+    except OSError:
+        forget_render(key)
+        return None
+    return entry[0]
+
+
+def store_render(key, data, extension):
+    """Save encoded pass bytes under key and evict old files past MAX_CACHE_BYTES, returns the path."""
+    global _cache_bytes, _stores_since_scan
+    os.makedirs(cache_dir(), exist_ok=True)
+    path = os.path.join(cache_dir(), key + extension)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    evicted = []
+    with _lock:
+        if _index is None:
+            _load_index()
+        old = _index.pop(key, None)
+        _cache_bytes += len(data) - (old[1] if old else 0)
+        _index[key] = (path, len(data))
+        _stores_since_scan += 1
+        # Worker processes all write to this folder, so the size limit is checked against what is on disk
+        if _cache_bytes > MAX_CACHE_BYTES or _stores_since_scan >= RESCAN_EVERY:
+            _load_index(known=_index)
+            _stores_since_scan = 0
+        while _cache_bytes > MAX_CACHE_BYTES and len(_index) > 1:
+            _, (old_path, old_size) = _index.popitem(last=False)
+            _cache_bytes -= old_size
+            evicted.append(old_path)
+    for old_path in evicted:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return path
+
+
+def forget_render(key):
+    global _cache_bytes
+    with _lock:
+        entry = _index.pop(key, None) if _index is not None else None
+        if entry is not None:
+            _cache_bytes -= entry[1]
+
+
+def render_cache_info():
+    with _lock:
+        if _index is None:
+            _load_index()
+        return {"entries": len(_index), "bytes": _cache_bytes, "max_bytes": MAX_CACHE_BYTES}
@@ -0,0 +1,57 @@
+#Pre-composited "shells" of random-avatar passes. Everything on such a pass except the attendee's name
+#and QR code comes from a small set: pillar x sample avatar x (avatar name, tagline) pair. A shell is
+#kept as the finished tiles of its dirty regions rather than a whole pass, split so the avatar tile is
+#shared by every name/tagline pair and the text tiles by every sample avatar of a pillar.
+
+from collections import OrderedDict
+import threading
+
+from compositor import composite
+
+# Shell tiles kept, a full warm-up of 6 pillars x 6 samples x 21 pairs needs 162
+MAX_SHELL_TILES = 256
+
+_tiles = OrderedDict()  # (id(base), *key) -> (base, [(tile, position)]), least recently used first
+_stats = {"hits": 0, "misses": 0}
+_lock = threading.Lock()
+
+
+def build_shell_tiles(base, boxes, layers):
+    # The base layer cropped to each box with the layers composited on, positions moved into the tile
+    tiles = []
+    for box in boxes:
+        tile = base.crop(box)
+        composite(tile, [(source, (x - box[0], y - box[1]), mask) for source, (x, y), mask in layers])
+        tiles.append((tile, box[:2]))
+    return tiles
+
+
+def get_shell_tiles(base, key, boxes, make_layers):
+    """Cached [(tile, position)] of base with make_layers() composited inside boxes - shared, do not draw on them.
+
+    make_layers is only called on a miss, so a hit does not even load the avatar.
+    """
+    cache_key = (id(base),) + tuple(key)
+    with _lock:
+        entry = _tiles.get(cache_key)
+        if entry is not None and entry[0] is base:
+            _tiles.move_to_end(cache_key)
+            _stats["hits"] += 1
+            return entry[1]
+        _stats["misses"] += 1
+    tiles = build_shell_tiles(base, boxes, make_layers())
+    with _lock:
+        _tiles[cache_key] = (base, tiles)
+        while len(_tiles) > MAX_SHELL_TILES:
+            _tiles.popitem(last=False)
+    return tiles
+
+
+def clear_shell_cache():
+    with _lock:
+        _tiles.clear()
+
+
+def shell_cache_info():
+    with _lock:
+        return dict(_stats, tiles=len(_tiles), max_tiles=MAX_SHELL_TILES)
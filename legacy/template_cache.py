@@ -0,0 +1,59 @@
+from collections import OrderedDict
+import os
+import threading
+
+from PIL import Image
+
+from assets import asset_dir
+
+# Six pillar templates plus the reference one
+MAX_TEMPLATES = 8
+
+_templates = OrderedDict()  # template_path -> (mtime_ns, decoded RGB image)
+_stats = {"hits": 0, "misses": 0}
+_lock = threading.Lock()
+
+
+def get_template_path(pillar):
+    return os.path.join(asset_dir("Templates"), f"{pillar}_TEMPLATE.png")
+
+
+def load_template(template_path):
+    """Return the decoded template, only decoding the PNG again when its mtime changes.
+
+    The image is shared between passes, never draw on it directly - use get_template_canvas.
+    """
+    mtime = os.stat(template_path).st_mtime_ns
+    with _lock:
+        entry = _templates.get(template_path)
+        if entry is not None and entry[0] == mtime:
+            _templates.move_to_end(template_path)
+            _stats["hits"] += 1
+            return entry[1]
+
+    with Image.open(template_path) as image:
+        template = image.convert('RGB')
+
+    with _lock:
+        _stats["misses"] += 1
+        _templates[template_path] = (mtime, template)
+        _templates.move_to_end(template_path)
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def get_template_canvas(template_path):
+    # A private copy of the decoded template, costs one memcpy instead of a PNG decode
+    return load_template(template_path).copy()
+
+
+def clear_template_cache():
+    with _lock:
+        _templates.clear()
+        _stats["hits"] = _stats["misses"] = 0
+
+
+def template_cache_info():
+    with _lock:
+        return {"size": len(_templates), "max_size": MAX_TEMPLATES, **_stats}
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+import math
+import threading
+
+from PIL import Image, ImageDraw
+
+from compositor import composite, fill_layer
+from font_cache import get_font
+
+# Attendee names seen recently, the fixed avatar name / tagline vocabulary is pinned separately
+MAX_TEXT_LAYERS = 1024
+# Auto-fit never shrinks text below this size
+MIN_FONT_SIZE = 20
+
+_pinned = {}  # (text, font, image_width) -> (mask, x)
+_recent = OrderedDict()  # same, least recently used first
+_advances = {}  # font -> {character: advance width in px}
+_lock = threading.Lock()
+
+
+def render_text_layer(text, font, image_width):
+    """Rasterize text centered on image_width into an 'L' glyph mask.
+
+    Returns (mask, x): pasting a colour through mask at (x, y) gives the same pixels as
+    ImageDraw.text at the horizontally centered position with its top at y.
+    """
+    draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+    text_bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = text_bbox[2] - text_bbox[0]
+    center_x = (image_width - text_width) / 2
+    # ImageDraw keeps the fractional part as a sub-pixel start, so the strip does the same
+    fraction = center_x - math.floor(center_x)
+    left = min(text_bbox[0], 0)
+    mask = Image.new('L', (text_bbox[2] - left + 2, max(text_bbox[3], 1)), 0)
+    ImageDraw.Draw(mask).text((fraction - left, 0), text, fill=255, font=font)
+    return mask, math.floor(center_x) + left
+
+
+def get_text_layer(text, font, image_width, pinned=False):
+    # font objects come from font_cache, so the font itself identifies (face, size, layout engine)
+    key = (text, font, image_width)
+    with _lock:
+        layer = _pinned.get(key)
+        if layer is None:
+            layer = _recent.get(key)
+            if layer is not None:
+                _recent.move_to_end(key)
+    if layer is None:
+        layer = render_text_layer(text, font, image_width)
+        with _lock:
+            if pinned:
+                _pinned[key] = layer
+            else:
+                _recent[key] = layer
+                while len(_recent) > MAX_TEXT_LAYERS:
+                    _recent.popitem(last=False)
+    return layer
+
+
+def centered_text_layer(text, font, y, image_width, fill="black", pinned=False):
+    """Compositor layer for text horizontally centered on image_width with its top at y.
+
+    pinned keeps the mask for the life of the process, for strings from a fixed vocabulary.
+    The mask does not depend on fill, so one cached mask serves every colour.
+    """
+    mask, x = get_text_layer(text, font, image_width, pinned)
+    return fill_layer(fill, (x, y), mask)
+
+
+def paste_centered_text(canvas, text, font, y, fill="black", pinned=False):
+    # Draw text horizontally centered on the canvas with one masked paste
+    composite(canvas, [centered_text_layer(text, font, y, canvas.width, fill, pinned)])
+
+
+def text_advance(text, font):
+    # Sum of cached per-character advances, kerning is ignored so this is a close upper estimate
+    with _lock:
+        advances = _advances.setdefault(font, {})
+    width = 0
+    for char in text:
+        advance = advances.get(char)
+        if advance is None:
+            advance = advances[char] = font.getlength(char)
+        width += advance
+    return width
+
+
+def fit_font(text, font_name, max_size, max_width, min_size=MIN_FONT_SIZE):
+    """Largest font size in [min_size, max_size] at which text fits max_width, by binary search."""
+    if text_advance(text, get_font(font_name, max_size)) <= max_width:
+        return get_font(font_name, max_size)
+    low, high = min_size, max_size - 1
+    while low < high:
+        size = (low + high + 1) // 2
+        if text_advance(text, get_font(font_name, size)) <= max_width:
+            low = size
+        else:
+            high = size - 1
+    return get_font(font_name, low)
+
+
+def fitted_text_layer(text, font_name, max_size, y, max_width, image_width, fill="black", pinned=False):
+    """centered_text_layer that shrinks the font until text fits max_width.
+
+    A shrunk line is moved down to stay vertically centered in the line box of max_size.
+    """
+    font = fit_font(text, font_name, max_size, max_width)
+    if font.size != max_size:
+        full_ascent, full_descent = get_font(font_name, max_size).getmetrics()
+        ascent, descent = font.getmetrics()
+        y += ((full_ascent + full_descent) - (ascent + descent)) // 2
+    return centered_text_layer(text, font, y, image_width, fill, pinned)
+
+
+def paste_fitted_text(canvas, text, font_name, max_size, y, max_width, fill="black", pinned=False):
+    composite(canvas, [fitted_text_layer(text, font_name, max_size, y, max_width, canvas.width, fill, pinned)])
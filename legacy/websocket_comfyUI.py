@@ -5,7 +5,6 @@
 import websocket #NOTE: websocket-client (https://github.com/websocket-client/websocket-client)
 import uuid
 import json
-import urllib.request
 import urllib.parse
 
 from PIL import Image
@@ -13,33 +12,64 @@ import random
 import io
 import os
 
+from assets import asset_dir
+from avatar_cache import sample_avatar_paths
+from comfy_files import read_output_image
+from comfy_http import http_request
+
 server_address = "127.0.0.1:8188"
 client_id = str(uuid.uuid4())
+# Per-request timeouts in seconds, images can take longer to send than the small JSON answers
+API_TIMEOUT = 10
+IMAGE_TIMEOUT = 30
+# True: custom avatars end in a SaveImageWebsocket node and arrive as websocket binary frames,
+# kept in memory with no /view download and no file in Avatars/
+WEBSOCKET_OUTPUT = False
+WS_OUTPUT_NODE = "save_image_websocket_node"
+# Node classes whose results are images, cached ones send no "executed" message
+OUTPUT_NODE_CLASSES = ("SaveImage", "PreviewImage", "SaveImageWebsocket")
 
-def queue_prompt(prompt):
+# All HTTP calls share keep-alive connections from comfy_http instead of a new connection each
+def queue_prompt(prompt, prompt_id=None):
+    # prompt_id: optional id chosen by the caller, so it can listen for the prompt before queueing it
     p = {"prompt": prompt, "client_id": client_id}
+    if prompt_id is not None:
+        p["prompt_id"] = prompt_id
     data = json.dumps(p).encode('utf-8')
-    req =  urllib.request.Request("http://{}/prompt".format(server_address), data=data)
-    output = json.loads(urllib.request.urlopen(req).read())
+    headers, body = http_request("POST", server_address, "/prompt", data, {"Content-Type": "application/json"}, API_TIMEOUT)
+    output = json.loads(body)
     return output
 
 def get_image(filename, subfolder, folder_type):
+    # Same-host setups read the saved file directly (comfy_files.COMFYUI_ROOT), /view is the fallback
+    image_data = read_output_image(filename, subfolder, folder_type)
+    if image_data is not None:
+        return image_data
     data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
     url_values = urllib.parse.urlencode(data)
-    with urllib.request.urlopen("http://{}/view?{}".format(server_address, url_values)) as response:
-        # print("http://{}/view?{}".format(server_address, url_values))
-        # print('output', response.read())
-        content_type = response.info().get_content_type()  # Gets the MIME type
-        print(f"Content-Type: {content_type}")
-        return response.read()
+    headers, body = http_request("GET", server_address, "/view?{}".format(url_values), timeout=IMAGE_TIMEOUT)
+    # print("http://{}/view?{}".format(server_address, url_values))
+    content_type = headers.get_content_type()  # Gets the MIME type
+    print(f"Content-Type: {content_type}")
+    return body
 
 def get_history(prompt_id):
-    with urllib.request.urlopen("http://{}/history/{}".format(server_address, prompt_id)) as response:
-        return json.loads(response.read())
+    headers, body = http_request("GET", server_address, "/history/{}".format(prompt_id), timeout=API_TIMEOUT)
+    return json.loads(body)
+
+def prompt_output_nodes(prompt):
+    return {node_id for node_id, node in prompt.items() if node.get("class_type") in OUTPUT_NODE_CLASSES}
+
+def ws_image_frame(out):
+    # Binary frames start with an event type and an image format (4 bytes each), then the encoded image
+    return out[8:]
 
 def get_images(ws, prompt):
     prompt_id = queue_prompt(prompt)['prompt_id']
-    output_images = {}
+    outputs = {}  # node_id -> output, straight from the "executed" messages
+    cached = False
+    frames = []  # images sent by the websocket output node
+    current_node = None
     while True:
         out = ws.recv()
         if isinstance(out, str):
@@ -48,24 +78,41 @@ def get_images(ws, prompt):
             if message['type'] == 'executed':
                 data = message['data']
                 if data['prompt_id'] == prompt_id:
-                    filename = data['output']['images'][0]['filename'] #To retrieve the filename of the image
-                    #To replace 0 with iteration if doing batch processing
-                    # print('filename', filename)
+                    outputs[data['node']] = data['output'] #filenames of the saved images, no /history needed
+
+            if message['type'] == 'execution_cached':
+                data = message['data']
+                if data['prompt_id'] == prompt_id and prompt_output_nodes(prompt) & set(data['nodes']):
+                    cached = True #cached output nodes send no "executed" message
 
 
             if message['type'] == 'executing':
                 data = message['data']
+                if data['prompt_id'] == prompt_id:
+                    current_node = data['node']
                 if data['node'] is None and data['prompt_id'] == prompt_id:
                     break #Execution is done
         else:
             # If you want to be able to decode the binary stream for latent previews, here is how you can do it:
             # bytesIO = BytesIO(out[8:])
             # preview_image = Image.open(bytesIO) # This is your preview in PIL image format, store it in a global
+            if current_node == WS_OUTPUT_NODE:
+                frames.append(ws_image_frame(out)) #the finished image, not a preview
             continue #previews are binary data
 
-    history = get_history(prompt_id)[prompt_id]
-    for node_id in history['outputs']:
-        node_output = history['outputs'][node_id]
+    if frames:
+        return {WS_OUTPUT_NODE: frames}
+    return get_output_images(prompt_id, None if cached else outputs)
+
+def get_output_images(prompt_id, outputs=None):
+    # Downloads every image a finished prompt saved, as {node_id: [image bytes]}
+    # outputs: {node_id: output} collected from the prompt's "executed" messages, /history is only
+    # asked when there are none (a missed message, outputs served from ComfyUI's cache)
+    output_images = {}
+    if not outputs:
+        outputs = get_history(prompt_id)[prompt_id]['outputs']
+    for node_id in outputs:
+        node_output = outputs[node_id]
         images_output = []
         if 'images' in node_output:
             for image in node_output['images']:
@@ -75,8 +122,8 @@ def get_images(ws, prompt):
 
     return output_images
 
-def get_random_avatar(avatar_type, personal_interest=None):
-    avatar_names = [
+# Random avatars get a matching (avatar name, tagline) pair from these lists
+AVATAR_NAMES = [
     "Innovative engineer",
     "Interdisciplinary architect",
     "Collaborative designer",
@@ -98,8 +145,8 @@ def get_random_avatar(avatar_type, personal_interest=None):
     "Visionary futurist",
     "Holistic systems-thinker",
     "Inclusive leader"
-    ]
-    taglines = [
+]
+TAGLINES = [
     "Building the future with innovation!",
     "Designing spaces that inspire!",
     "Crafting solutions with creativity!",
@@ -119,22 +166,29 @@ def get_random_avatar(avatar_type, personal_interest=None):
     "Navigating global challenges with insight!",
     "Innovating with digital expertise!",
     "Envisioning tomorrow with creativity!",
-    "Designing holistic solutions for complex problems!"
+    "Designing holistic solutions for complex problems!",
     "Trailblazing a better world by design!"]
 
-    random_number = random.randint(0, 20)
-    avatar_name = avatar_names[random_number]
-    tagline = taglines[random_number]
+
+def get_random_avatar(avatar_type, personal_interest=None, seed=None):
+    # seed: e.g. the attendee's QR payload, so the same attendee always gets the same avatar and text
+    rng = random.Random(seed) if seed is not None else random
+    random_number = rng.randint(0, len(AVATAR_NAMES) - 1)
+    avatar_name = AVATAR_NAMES[random_number]
+    tagline = TAGLINES[random_number]
     
-    random_avatar_number = random.randint(1, 3)
-    script_dir = os.path.dirname(__file__)
-    avatar_base_path = os.path.join(script_dir, "Samples\\")
-    avatar_path = avatar_base_path + f'{avatar_type}_Sample{random_avatar_number}.png'    
+    # Any Samples/{avatar_type}_Sample*.png counts, not just Sample1-3
+    sample_paths = sample_avatar_paths(avatar_type)
+    if sample_paths:
+        avatar_path = rng.choice(sample_paths)
+    else:
+        avatar_path = os.path.join(asset_dir("Samples"), f'{avatar_type}_Sample1.png')  # reported missing by the renderer
 
     return avatar_name, tagline, avatar_path
 
-def get_custom_avatar(avatar_type, personal_interest):
-    # call websocket to get custom avatar
+def build_avatar_prompt(avatar_type, personal_interest, websocket_output=False):
+    # ComfyUI workflow for one custom avatar, node "38" saves the image
+    # websocket_output: send the image back over the websocket (WS_OUTPUT_NODE) instead of saving it
     prompt_text = """
 {
   "3": {
@@ -247,11 +301,26 @@ def get_custom_avatar(avatar_type, personal_interest):
     seed = random.choice([1,2,3]) # TODO set a fixed set of seeds available
     prompt["3"]["inputs"]["seed"] = 785790463864390
 
-    ws = websocket.WebSocket()
-    ws.connect("ws://{}/ws?clientId={}".format(server_address, client_id))
-    images = get_images(ws, prompt)
-    ws.close()
-    
+    if websocket_output:
+        save_node = prompt.pop("38")
+        prompt[WS_OUTPUT_NODE] = {"inputs": {"images": save_node["inputs"]["images"]}, "class_type": "SaveImageWebsocket"}
+    return prompt
+
+def custom_avatar_text(avatar_type, personal_interest):
+    avatar_name = f"{personal_interest} {avatar_type}"
+    tagline = f"Trailblazing a better world by design!"
+    return avatar_name, tagline
+
+def avatar_from_frames(images, avatar_type, personal_interest):
+    # Returns (avatar_name, tagline, PNG bytes) for an avatar received as websocket frames,
+    # the renderer opens the bytes in memory wherever it would open an avatar path
+    frames = images.get(WS_OUTPUT_NODE) or []
+    if not frames:
+        raise RuntimeError(f"ComfyUI sent no avatar image for {avatar_type} {personal_interest}")
+    return custom_avatar_text(avatar_type, personal_interest) + (bytes(frames[-1]),)
+
+def save_avatar_images(images, avatar_type, personal_interest):
+    # Writes the generated avatar into Avatars/ and returns (avatar_name, tagline, avatar_path)
     script_dir = os.path.dirname(__file__)
     avatar_folder = os.path.join(script_dir, "Avatars")
     os.makedirs(avatar_folder, exist_ok=True)
@@ -262,6 +331,21 @@ def get_custom_avatar(avatar_type, personal_interest):
             image.save(avatar_path)
 
     print('avatar_path',avatar_path)
-    avatar_name = f"{personal_interest} {avatar_type}"
-    tagline = f"Trailblazing a better world by design!"
-    return avatar_name, tagline, avatar_path
\ No newline at end of file
+    return custom_avatar_text(avatar_type, personal_interest) + (avatar_path,)
+
+def get_custom_avatar(avatar_type, personal_interest, websocket_output=None):
+    # call websocket to get custom avatar
+    # (comfy_async.get_custom_avatar_async shares one websocket between many avatars in flight)
+    # websocket_output: defaults to WEBSOCKET_OUTPUT, avatar_path is then the PNG bytes (see avatar_from_frames)
+    if websocket_output is None:
+        websocket_output = WEBSOCKET_OUTPUT
+    prompt = build_avatar_prompt(avatar_type, personal_interest, websocket_output)
+
+    ws = websocket.WebSocket()
+    ws.connect("ws://{}/ws?clientId={}".format(server_address, client_id))
+    images = get_images(ws, prompt)
+    ws.close()
+
+    if websocket_output:
+        return avatar_from_frames(images, avatar_type, personal_interest)
+    return save_avatar_images(images, avatar_type, personal_interest)
\ No newline at end of file